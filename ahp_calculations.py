@@ -1,6 +1,11 @@
+import json
+import os
+import threading
 import numpy as np
 import pandas as pd
+from datetime import datetime
 from utils.db_functions import *
+from utils.cache_utils import make_cache_key, get_cached_weights, set_cached_weights, invalidate_weight_cache
 
 def calculate_ahp(matrix):
     """Menghitung seluruh komponen AHP"""
@@ -30,21 +35,245 @@ def calculate_ahp(matrix):
         'consistency_vector': np.dot(matrix, weights) / weights
     }
 
+def solve_principal_eigen(stack, tol=1e-12, max_iter=1000, initial=None):
+    """
+    Vektor eigen utama (dinormalisasi, jumlah 1) dan lambda max untuk tumpukan
+    matriks resiprokal positif berukuran sama (b x n x n), dengan power iteration.
+    initial (n atau b x n) dipakai sebagai titik awal iterasi, default vektor seragam.
+    """
+    b, n = stack.shape[0], stack.shape[1]
+    if initial is None:
+        weights = np.full((b, n), 1.0 / n)
+    else:
+        weights = np.broadcast_to(np.asarray(initial, dtype=float), (b, n)).copy()
+        weights /= weights.sum(axis=1, keepdims=True)
+    for _ in range(max_iter):
+        next_weights = np.einsum('bij,bj->bi', stack, weights)
+        next_weights /= next_weights.sum(axis=1, keepdims=True)
+        converged = np.max(np.abs(next_weights - weights)) < tol
+        weights = next_weights
+        if converged:
+            break
+    
+    lambda_max = np.einsum('bij,bj->bi', stack, weights).sum(axis=1)
+    return weights, lambda_max
+
+def calculate_ahp_batch(matrices, tol=1e-12, max_iter=1000):
+    """
+    Menghitung komponen AHP untuk banyak matriks perbandingan sekaligus.
+    Matriks dikelompokkan per ukuran, lalu vektor eigen utama dicari dengan
+    power iteration (konvergen untuk matriks resiprokal positif).
+    Return:
+        list hasil dengan urutan dan key yang sama seperti calculate_ahp
+    """
+    results = [None] * len(matrices)
+    groups = {}
+    for idx, matrix in enumerate(matrices):
+        groups.setdefault(matrix.shape[0], []).append(idx)
+    
+    for n, indices in groups.items():
+        stack = np.stack([np.asarray(matrices[idx], dtype=float) for idx in indices])
+        
+        # Power iteration untuk seluruh matriks berukuran n
+        weights, lambda_max = solve_principal_eigen(stack, tol=tol, max_iter=max_iter)
+        weighted_sum = np.einsum('bij,bj->bi', stack, weights)
+        ci = (lambda_max - n) / (n - 1) if n > 1 else np.zeros(len(indices))
+        ri = get_random_index(n)
+        cr = ci / ri if ri != 0 else np.zeros(len(indices))
+        normalized = stack / stack.sum(axis=1, keepdims=True)
+        
+        for b, idx in enumerate(indices):
+            results[idx] = {
+                'weights': weights[b],
+                'lambda_max': lambda_max[b],
+                'ci': ci[b],
+                'ri': ri,
+                'cr': cr[b],
+                'normalized_matrix': normalized[b],
+                'weighted_sum': weighted_sum[b],
+                'consistency_vector': weighted_sum[b] / weights[b]
+            }
+    
+    return results
+
+# Random Index Saaty untuk n <= 10; ukuran lain disimulasikan sekali lalu disimpan ke disk
+RI_TABLE = {1: 0.0, 2: 0.0, 3: 0.58, 4: 0.9, 5: 1.12,
+            6: 1.24, 7: 1.32, 8: 1.41, 9: 1.45, 10: 1.49}
+RI_TABLE_PATH = os.environ.get(
+    "AHP_RI_TABLE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "random_index.json")
+)
+RI_SAMPLES = 20000
+RI_BATCH_ELEMENTS = 4_000_000
+SAATY_VALUES = np.array([1/9, 1/8, 1/7, 1/6, 1/5, 1/4, 1/3, 1/2, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+SAATY_MIN, SAATY_MAX = 1 / 9, 9
+
+_simulated_ri = None
+_simulated_ri_lock = threading.Lock()
+
+def simulate_random_index(n, n_samples=RI_SAMPLES, seed=None):
+    """
+    Estimasi Random Index: rata-rata CI dari matriks resiprokal acak
+    (elemen segitiga atas diambil seragam dari skala Saaty 1/9..9),
+    diselesaikan per batch dengan solve_principal_eigen
+    """
+    if n <= 2:
+        return 0.0
+    
+    rng = np.random.default_rng(n if seed is None else seed)
+    rows, cols = np.triu_indices(n, 1)
+    batch_size = max(1, RI_BATCH_ELEMENTS // (n * n))
+    ci_sum = 0.0
+    for start in range(0, n_samples, batch_size):
+        b = min(batch_size, n_samples - start)
+        upper = rng.choice(SAATY_VALUES, size=(b, len(rows)))
+        stack = np.ones((b, n, n))
+        stack[:, rows, cols] = upper
+        stack[:, cols, rows] = 1 / upper
+        _, lambda_max = solve_principal_eigen(stack, tol=1e-10)
+        ci_sum += ((lambda_max - n) / (n - 1)).sum()
+    return float(ci_sum / n_samples)
+
+def _load_simulated_ri():
+    """Membaca tabel RI hasil simulasi dari disk (sekali per proses)"""
+    global _simulated_ri
+    if _simulated_ri is None:
+        try:
+            with open(RI_TABLE_PATH) as f:
+                _simulated_ri = {int(n): float(ri) for n, ri in json.load(f).items()}
+        except (OSError, ValueError):
+            _simulated_ri = {}
+    return _simulated_ri
+
+def _save_simulated_ri(table):
+    """Menulis tabel RI secara atomik agar proses lain tidak membaca file setengah jadi"""
+    try:
+        os.makedirs(os.path.dirname(RI_TABLE_PATH), exist_ok=True)
+        tmp_path = f"{RI_TABLE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({str(n): ri for n, ri in sorted(table.items())}, f, indent=2)
+        os.replace(tmp_path, RI_TABLE_PATH)
+    except OSError as e:
+        print(f"Tabel Random Index tidak dapat disimpan: {e}")
+
 def get_random_index(n):
     """Mengembalikan Random Index berdasarkan ukuran matriks"""
-    ri_table = {1: 0.0, 2: 0.0, 3: 0.58, 4: 0.9, 5: 1.12,
-                6: 1.24, 7: 1.32, 8: 1.41, 9: 1.45, 10: 1.49}
-    return ri_table.get(n, 1.5)
+    if n in RI_TABLE:
+        return RI_TABLE[n]
+    
+    with _simulated_ri_lock:
+        table = _load_simulated_ri()
+        if n not in table:
+            table[n] = simulate_random_index(n)
+            _save_simulated_ri(table)
+        return table[n]
 
-def get_kriteria_weights():
-    """Menghitung bobot kriteria"""
-    kriteria = get_data("kriteria")
-    n = len(kriteria)
+# Jumlah pasangan perbandingan yang disarankan untuk direvisi
+INCONSISTENCY_TOP_K = 3
+
+def locate_inconsistencies(matrix, top_k=INCONSISTENCY_TOP_K, result=None):
+    """
+    Mencari pasangan perbandingan yang paling menyebabkan inkonsistensi.
+    Setiap elemen a_ij dibandingkan dengan nilai konsistennya w_i/w_j; untuk setiap
+    pasangan, matriks dengan a_ij diganti nilai tersebut (dibatasi skala 1/9..9)
+    diselesaikan sekaligus dalam satu tumpukan dengan solve_principal_eigen
+    (dimulai dari bobot saat ini), sehingga penurunan CR tiap kandidat diketahui
+    tanpa menghitung eig per kandidat.
     
-    if n == 0:
-        return {}, 0.0
+    Args:
+        matrix: matriks perbandingan (seperti input calculate_ahp)
+        top_k: jumlah pasangan yang dikembalikan
+        result: hasil calculate_ahp(matrix) jika sudah dihitung
+    Return:
+        list dict (i, j, nilai, saran, deviasi, cr_baru, penurunan_cr) dengan i < j,
+        diurutkan dari penurunan CR terbesar; kosong jika tidak ada perbaikan
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    n = matrix.shape[0]
+    if n < 3:
+        return []
+    if result is None:
+        result = calculate_ahp(matrix)
+    ri = result['ri']
+    if ri == 0:
+        return []
+    
+    weights = np.asarray(result['weights'], dtype=float)
+    rows, cols = np.triu_indices(n, 1)
+    current = matrix[rows, cols]
+    consistent = weights[rows] / weights[cols]
+    # Deviasi log: 0 berarti penilaian sudah sesuai bobot yang dihasilkan
+    deviation = np.abs(np.log(current / consistent))
+    suggested = np.clip(consistent, SAATY_MIN, SAATY_MAX)
     
-    perbandingan = get_data("perbandingan_kriteria")
+    candidates = np.broadcast_to(matrix, (len(rows), n, n)).copy()
+    pairs = np.arange(len(rows))
+    candidates[pairs, rows, cols] = suggested
+    candidates[pairs, cols, rows] = 1 / suggested
+    _, lambda_max = solve_principal_eigen(candidates, tol=1e-10, initial=weights)
+    new_cr = (lambda_max - n) / (n - 1) / ri
+    improvement = result['cr'] - new_cr
+    
+    order = np.lexsort((-deviation, -improvement))
+    return [
+        {
+            'i': int(rows[k]),
+            'j': int(cols[k]),
+            'nilai': float(current[k]),
+            'saran': float(suggested[k]),
+            'deviasi': float(deviation[k]),
+            'cr_baru': float(new_cr[k]),
+            'penurunan_cr': float(improvement[k])
+        }
+        for k in order[:top_k]
+        if improvement[k] > 1e-9
+    ]
+
+class IncrementalAHP:
+    """
+    Solver AHP untuk satu matriks perbandingan yang diubah satu elemen setiap kali
+    (mis. saat slider digeser). Vektor eigen utama terakhir disimpan dan dipakai
+    sebagai titik awal power iteration setelah perubahan, sehingga lambda max dan CR
+    diperbarui dalam beberapa iterasi tanpa menghitung eig atau membaca database.
+    """
+    
+    def __init__(self, matrix, tol=1e-10, max_iter=1000):
+        self.matrix = np.array(matrix, dtype=float)
+        self.n = self.matrix.shape[0]
+        self.tol = tol
+        self.max_iter = max_iter
+        self.weights = np.full(self.n, 1.0 / self.n)
+        self._solve()
+    
+    def _solve(self):
+        weights, lambda_max = solve_principal_eigen(
+            self.matrix[np.newaxis], tol=self.tol, max_iter=self.max_iter, initial=self.weights
+        )
+        self.weights = weights[0]
+        self.lambda_max = float(lambda_max[0])
+    
+    def update(self, i, j, value):
+        """Mengubah a_ij (dan 1/a_ij pada a_ji) lalu memperbarui bobot dari bobot sebelumnya"""
+        if i != j and self.matrix[i, j] != value:
+            self.matrix[i, j] = value
+            self.matrix[j, i] = 1 / value
+            self._solve()
+        return self.result()
+    
+    def result(self):
+        """Bobot, lambda max, CI, RI, dan CR untuk matriks saat ini"""
+        ci = (self.lambda_max - self.n) / (self.n - 1) if self.n > 1 else 0.0
+        ri = get_random_index(self.n)
+        return {
+            'weights': self.weights.copy(),
+            'lambda_max': self.lambda_max,
+            'ci': ci,
+            'ri': ri,
+            'cr': ci / ri if ri != 0 else 0
+        }
+
+def build_kriteria_matrix(n, perbandingan):
+    """Matriks perbandingan kriteria n x n (indeks = id_kriteria - 1)"""
     matrix = np.ones((n, n))
     
     for p in perbandingan:
@@ -53,41 +282,100 @@ def get_kriteria_weights():
         matrix[i, j] = p['nilai_perbandingan']
         matrix[j, i] = 1 / p['nilai_perbandingan']
     
+    return matrix
+
+def get_kriteria_weights():
+    """Menghitung bobot kriteria (di-cache berdasarkan isi data perbandingan)"""
+    kriteria = get_data("kriteria", columns=["id_kriteria"])
+    n = len(kriteria)
+    
+    if n == 0:
+        return {}, 0.0
+    
+    perbandingan = get_data(
+        "perbandingan_kriteria", columns=["id_kriteria1", "id_kriteria2", "nilai_perbandingan"]
+    )
+    cache_key = make_cache_key(
+        "kriteria",
+        [k['id_kriteria'] for k in kriteria],
+        [(p['id_kriteria1'], p['id_kriteria2'], p['nilai_perbandingan']) for p in perbandingan]
+    )
+    cached = get_cached_weights(cache_key)
+    if cached is not None:
+        return cached
+    
+    matrix = build_kriteria_matrix(n, perbandingan)
     result = calculate_ahp(matrix)
     weights = {kriteria[i]['id_kriteria']: result['weights'][i] for i in range(n)}
     
+    set_cached_weights(cache_key, (weights, result['cr']))
     return weights, result['cr']
 
 def get_subkriteria_weights():
-    """Menghitung bobot subkriteria untuk semua kriteria"""
-    kriteria = get_data("kriteria")
+    """Menghitung bobot subkriteria untuk semua kriteria (di-cache per kriteria)"""
+    kriteria = get_data("kriteria", columns=["id_kriteria"])
     subkriteria_weights = {}
-    cr_results = {}
+    
+    # Ambil seluruh subkriteria dan perbandingannya sekaligus, lalu kelompokkan per kriteria
+    subkriteria_by_kriteria = {}
+    for sub in get_data("subkriteria"):
+        subkriteria_by_kriteria.setdefault(sub['id_kriteria'], []).append(sub)
+    perbandingan_by_kriteria = {}
+    for p in get_data(
+        "perbandingan_subkriteria",
+        columns=["id_kriteria", "id_subkriteria1", "id_subkriteria2", "nilai_perbandingan"]
+    ):
+        perbandingan_by_kriteria.setdefault(p['id_kriteria'], []).append(p)
+    
+    pending = []
     
     for k in kriteria:
-        subkriteria = get_data("subkriteria", where=f"id_kriteria={k['id_kriteria']}")
+        subkriteria = subkriteria_by_kriteria.get(k['id_kriteria'], [])
         n = len(subkriteria)
         
         if n < 2:
             continue
             
-        perbandingan = get_data("perbandingan_subkriteria", where=f"id_kriteria={k['id_kriteria']}")
-        
-        matrix = np.ones((n, n))
-        for p in perbandingan:
-            i = p['id_subkriteria1'] - min(sub['id_subkriteria'] for sub in subkriteria)
-            j = p['id_subkriteria2'] - min(sub['id_subkriteria'] for sub in subkriteria)
-            matrix[i, j] = p['nilai_perbandingan']
-            matrix[j, i] = 1 / p['nilai_perbandingan']
+        perbandingan = perbandingan_by_kriteria.get(k['id_kriteria'], [])
+        cache_key = make_cache_key(
+            "subkriteria",
+            k['id_kriteria'],
+            [(sub['id_subkriteria'], sub['nama_subkriteria']) for sub in subkriteria],
+            [(p['id_subkriteria1'], p['id_subkriteria2'], p['nilai_perbandingan']) for p in perbandingan]
+        )
+        cached = get_cached_weights(cache_key)
         
-        result = calculate_ahp(matrix)
-        subkriteria_weights[k['id_kriteria']] = {
+        if cached is None:
+            min_id = min(sub['id_subkriteria'] for sub in subkriteria)
+            matrix = np.ones((n, n))
+            for p in perbandingan:
+                i = p['id_subkriteria1'] - min_id
+                j = p['id_subkriteria2'] - min_id
+                matrix[i, j] = p['nilai_perbandingan']
+                matrix[j, i] = 1 / p['nilai_perbandingan']
+            pending.append((k['id_kriteria'], cache_key, subkriteria, matrix))
+        else:
+            subkriteria_weights[k['id_kriteria']] = {**cached, 'subkriteria': subkriteria}
+    
+    # Hitung seluruh matriks yang belum ada di cache dalam satu kali pemanggilan
+    results = calculate_ahp_batch([matrix for _, _, _, matrix in pending])
+    for (id_kriteria, cache_key, subkriteria, matrix), result in zip(pending, results):
+        n = len(subkriteria)
+        entry = {
             'weights': {subkriteria[i]['id_subkriteria']: result['weights'][i] for i in range(n)},
             'cr': result['cr'],
             'matrix': matrix,
             'subkriteria': subkriteria
         }
-        cr_results[k['id_kriteria']] = result['cr']
+        set_cached_weights(cache_key, entry)
+        subkriteria_weights[id_kriteria] = entry
+    
+    # Susun ulang hasil sesuai urutan kriteria
+    subkriteria_weights = {
+        k['id_kriteria']: subkriteria_weights[k['id_kriteria']]
+        for k in kriteria if k['id_kriteria'] in subkriteria_weights
+    }
+    cr_results = {id_kriteria: entry['cr'] for id_kriteria, entry in subkriteria_weights.items()}
     
     return subkriteria_weights, cr_results
 # Fungsi perhitungan lainnya...
@@ -95,8 +383,9 @@ def get_subkriteria_weights():
 def get_perbandingan_subkriteria(id_kriteria):
     """Mengambil perbandingan subkriteria berdasarkan kriteria"""
     return get_data(
-        "perbandingan_subkriteria", 
-        where=f"id_kriteria={id_kriteria}"
+        "perbandingan_subkriteria",
+        where="id_kriteria = %s",
+        params=(id_kriteria,)
     )
 
 def save_perbandingan_subkriteria(id_kriteria, id_subkriteria1, id_subkriteria2, nilai):
@@ -134,6 +423,8 @@ def save_perbandingan_subkriteria(id_kriteria, id_subkriteria1, id_subkriteria2,
                 (id_kriteria, id_subkriteria1, id_subkriteria2, nilai)
             )
         conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -160,6 +451,8 @@ def delete_perbandingan_subkriteria(id_kriteria, id_subkriteria1, id_subkriteria
             (id_kriteria, id_subkriteria1, id_subkriteria2, id_subkriteria2, id_subkriteria1)
         )
         conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -183,69 +476,463 @@ def display_comparison_matrix(items, comparisons, item_type):
     
     df = pd.DataFrame(matrix, index=item_names, columns=item_names)
     st.dataframe(df.style.format("{:.3f}"), use_container_width=True)
-def calculate_ranking():
+def build_weight_matrix(kriteria_weights, subkriteria_weights):
+    """
+    Menyusun bobot global subkriteria dalam bentuk matriks blok
+    (subkriteria x kriteria), berisi bobot kriteria x bobot lokal subkriteria
+    Return:
+        list id kriteria, list id subkriteria, matriks bobot global
+    """
+    kriteria_ids = list(kriteria_weights.keys())
+    sub_ids, owners, global_weights = [], [], []
+    
+    for k_idx, id_kriteria in enumerate(kriteria_ids):
+        if id_kriteria not in subkriteria_weights:
+            continue
+        for id_sub, sub_weight in subkriteria_weights[id_kriteria]['weights'].items():
+            sub_ids.append(id_sub)
+            owners.append(k_idx)
+            global_weights.append(sub_weight * kriteria_weights[id_kriteria])
+    
+    weight_matrix = np.zeros((len(sub_ids), len(kriteria_ids)))
+    weight_matrix[np.arange(len(sub_ids)), owners] = global_weights
+    
+    return kriteria_ids, sub_ids, weight_matrix
+
+def build_score_matrix(guru_ids, sub_ids, nilai_subkriteria):
+    """
+    Menyusun matriks nilai guru x subkriteria dari baris nilai_subkriteria.
+    Jika ada beberapa baris untuk pasangan yang sama, baris pertama yang dipakai;
+    nilai yang tidak ada dianggap 0.
+    """
+    scores = np.zeros((len(guru_ids), len(sub_ids)))
+    if not nilai_subkriteria or scores.size == 0:
+        return scores
+    
+    df = pd.DataFrame(nilai_subkriteria, columns=['id_guru', 'id_subkriteria', 'nilai'])
+    df = df.drop_duplicates(subset=['id_guru', 'id_subkriteria'], keep='first')
+    
+    rows = pd.Index(guru_ids).get_indexer(df['id_guru'])
+    cols = pd.Index(sub_ids).get_indexer(df['id_subkriteria'])
+    valid = (rows >= 0) & (cols >= 0)
+    scores[rows[valid], cols[valid]] = df['nilai'].to_numpy(dtype=float)[valid]
+    
+    return scores
+
+def calculate_scores(guru_list, nilai_subkriteria, kriteria_weights, subkriteria_weights):
+    """
+    Menghitung nilai total dan nilai per kriteria seluruh guru sekaligus
+    Return:
+        list id kriteria, array nilai total (guru), array nilai per kriteria (guru x kriteria)
+    """
+    kriteria_ids, sub_ids, weight_matrix = build_weight_matrix(kriteria_weights, subkriteria_weights)
+    guru_ids = [guru['id_guru'] for guru in guru_list]
+    scores = build_score_matrix(guru_ids, sub_ids, nilai_subkriteria)
+    
+    detail_scores = scores @ weight_matrix
+    total_scores = detail_scores.sum(axis=1)
+    
+    return kriteria_ids, total_scores, detail_scores
+
+# Jumlah titik grid bobot per kriteria pada analisis sensitivitas
+SENSITIVITY_GRID_SIZE = 51
+
+def ranking_contributions(df_results, kriteria_weights):
+    """
+    Nilai guru per kriteria sebelum dikalikan bobot kriteria (guru x kriteria),
+    diturunkan dari kolom "Kriteria {id}" hasil perankingan
+    Return:
+        list id kriteria, array bobot kriteria, matriks kontribusi
+    """
+    kriteria_ids = [k for k in kriteria_weights if f"Kriteria {k}" in df_results.columns]
+    weights = np.array([kriteria_weights[k] for k in kriteria_ids], dtype=float)
+    detail = df_results[[f"Kriteria {k}" for k in kriteria_ids]].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        contributions = np.where(weights > 0, detail / weights, 0.0)
+    return kriteria_ids, weights, contributions
+
+def _rank_desc(values):
+    """Peringkat (method='min', nilai terbesar = 1) untuk setiap baris matriks"""
+    values = np.round(np.atleast_2d(values), 10)
+    order = np.argsort(-values, axis=1, kind='stable')
+    sorted_values = np.take_along_axis(values, order, axis=1)
+    # Posisi awal kelompok nilai yang sama menjadi peringkat seluruh anggotanya
+    positions = np.arange(values.shape[1])
+    is_start = np.ones(values.shape, dtype=bool)
+    is_start[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    group_start = np.maximum.accumulate(np.where(is_start, positions, 0), axis=1)
+    ranks = np.empty(values.shape, dtype=np.int64)
+    np.put_along_axis(ranks, order, group_start + 1, axis=1)
+    return ranks
+
+def weight_sensitivity(contributions, weights, grid_size=SENSITIVITY_GRID_SIZE):
+    """
+    Analisis sensitivitas bobot kriteria: bobot satu kriteria diubah dari 0 sampai 1,
+    bobot kriteria lain dinormalisasi ulang secara proporsional (jumlah tetap 1),
+    lalu nilai seluruh guru dihitung ulang sekaligus dengan satu perkalian matriks.
+    
+    Args:
+        contributions: matriks guru x kriteria (nilai sebelum dikali bobot kriteria)
+        weights: bobot kriteria saat ini
+    Return dict:
+        grid: titik bobot (G,)
+        totals: nilai total (kriteria x grid x guru)
+        ranks: peringkat (kriteria x grid x guru)
+        base_rank: peringkat saat ini (guru)
+        order: indeks guru urut peringkat saat ini
+        swap_weight: bobot kriteria k saat guru peringkat r dan r+1 bertukar
+                     (kriteria x pasangan, NaN jika tidak terjadi pada bobot 0-1)
+        nearest_swap: perubahan bobot terkecil yang membuat guru bertukar dengan tetangganya
+        stability: fraksi titik grid dengan peringkat guru tetap
+    """
+    contributions = np.asarray(contributions, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    n_guru, n_kriteria = contributions.shape
+    grid = np.linspace(0, 1, grid_size)
+    
+    # Bobot hasil perturbasi (kriteria x grid x kriteria)
+    rest = 1 - weights
+    scale = np.divide(1 - grid[None, :], rest[:, None], out=np.zeros((n_kriteria, grid_size)), where=rest[:, None] > 0)
+    grid_weights = scale[:, :, None] * weights[None, None, :]
+    grid_weights[np.arange(n_kriteria), :, np.arange(n_kriteria)] = grid
+    
+    totals = grid_weights @ contributions.T
+    base = contributions @ weights
+    ranks = _rank_desc(totals.reshape(-1, n_guru)).reshape(n_kriteria, grid_size, n_guru)
+    base_rank = _rank_desc(base)[0]
+    order = np.argsort(-base, kind='stable')
+    
+    # Nilai total linear terhadap bobot t: t * U + (1 - t) * R, R = nilai dari kriteria lain
+    with np.errstate(invalid='ignore', divide='ignore'):
+        others = np.where(rest > 0, (base[:, None] - contributions * weights) / rest, 0.0)
+    upper, lower = order[:-1], order[1:]
+    d_contrib = (contributions[upper] - contributions[lower]).T
+    d_others = (others[upper] - others[lower]).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        swap_weight = d_others / (d_others - d_contrib)
+    swap_weight[~((swap_weight >= 0) & (swap_weight <= 1))] = np.nan
+    
+    # Jarak bobot ke pertukaran terdekat, per pasangan lalu per guru
+    pair_distance = np.nanmin(
+        np.vstack([np.abs(swap_weight - weights[:, None]), np.full((1, n_guru - 1), np.inf)]),
+        axis=0
+    ) if n_guru > 1 else np.array([])
+    by_position = np.full(n_guru, np.inf)
+    if n_guru > 1:
+        by_position[:-1] = pair_distance
+        by_position[1:] = np.minimum(by_position[1:], pair_distance)
+    nearest_swap = np.empty(n_guru)
+    nearest_swap[order] = by_position
+    
+    stability = (ranks == base_rank[None, None, :]).mean(axis=(0, 1))
+    
+    return {
+        'grid': grid,
+        'totals': totals,
+        'ranks': ranks,
+        'base_rank': base_rank,
+        'order': order,
+        'swap_weight': swap_weight,
+        'nearest_swap': nearest_swap,
+        'stability': stability
+    }
+
+# Simulasi Monte Carlo: jumlah elemen nilai total per batch dan jumlah posisi
+# peringkat teratas yang distribusinya dicatat (memori guru x posisi, bukan guru x guru)
+MONTE_CARLO_BATCH_ELEMENTS = 4_000_000
+MONTE_CARLO_TRACKED_RANKS = 100
+
+def perturb_matrices(matrix, n_samples, sigma, rng):
+    """
+    Sampel matriks resiprokal di sekitar matriks perbandingan: setiap elemen
+    segitiga atas dikalikan noise log-normal exp(sigma * z), dibatasi ke skala
+    Saaty, lalu elemen segitiga bawah diisi kebalikannya
+    """
+    n = matrix.shape[0]
+    rows, cols = np.triu_indices(n, 1)
+    upper = matrix[rows, cols] * np.exp(sigma * rng.standard_normal((n_samples, len(rows))))
+    upper = np.clip(upper, SAATY_MIN, SAATY_MAX)
+    
+    stack = np.ones((n_samples, n, n))
+    stack[:, rows, cols] = upper
+    stack[:, cols, rows] = 1 / upper
+    return stack
+
+def _monte_carlo_worker(kriteria_matrix, sub_blocks, scores, n_samples, sigma, batch_size, seed, tracked):
+    """
+    Menjalankan n_samples simulasi dalam batch dan menghitung distribusi peringkat
+    Return:
+        matriks jumlah kemunculan guru x peringkat 1..tracked (peringkat 1 di kolom 0),
+        jumlah peringkat per guru (untuk rata-rata)
+    """
+    rng = np.random.default_rng(seed)
+    n_guru, n_sub = scores.shape
+    rank_counts = np.zeros(n_guru * tracked, dtype=np.int64)
+    rank_sum = np.zeros(n_guru, dtype=np.int64)
+    guru_index = np.arange(n_guru)
+    
+    for start in range(0, n_samples, batch_size):
+        b = min(batch_size, n_samples - start)
+        kriteria_weights, _ = solve_principal_eigen(
+            perturb_matrices(kriteria_matrix, b, sigma, rng), tol=1e-9
+        )
+        
+        # Bobot global subkriteria per sampel (b x subkriteria)
+        global_weights = np.zeros((b, n_sub))
+        for k_idx, matrix, cols in sub_blocks:
+            local_weights, _ = solve_principal_eigen(perturb_matrices(matrix, b, sigma, rng), tol=1e-9)
+            global_weights[:, cols] = local_weights * kriteria_weights[:, [k_idx]]
+        
+        # Nilai total dan peringkat seluruh guru untuk seluruh sampel sekaligus;
+        # nilai sama mendapat peringkat terkecil (method='min') seperti Peringkat
+        totals = global_weights @ scores.T
+        ranks = _rank_desc(totals)
+        in_tracked = ranks <= tracked
+        rank_counts += np.bincount(
+            (guru_index * tracked + ranks - 1)[in_tracked], minlength=n_guru * tracked
+        )
+        rank_sum += ranks.sum(axis=0)
+    
+    return rank_counts.reshape(n_guru, tracked), rank_sum
+
+def simulate_rank_distribution(kriteria_matrix, sub_blocks, scores, n_samples=10000, sigma=0.2,
+                               n_jobs=1, seed=0, tracked=MONTE_CARLO_TRACKED_RANKS):
+    """
+    Distribusi peringkat guru dari simulasi Monte Carlo atas penilaian perbandingan.
+    
+    Args:
+        kriteria_matrix: matriks perbandingan kriteria
+        sub_blocks: list (indeks kriteria, matriks perbandingan subkriteria, indeks kolom scores)
+        scores: matriks nilai guru x subkriteria
+        sigma: simpangan baku noise log-normal pada setiap penilaian
+        n_jobs: jumlah proses (1 = tanpa process pool)
+        tracked: jumlah posisi peringkat teratas yang distribusinya dicatat
+    Return:
+        matriks jumlah kemunculan guru x peringkat 1..tracked, jumlah peringkat per guru
+    """
+    n_guru = scores.shape[0]
+    tracked = max(1, min(tracked, n_guru))
+    batch_size = max(1, min(n_samples, MONTE_CARLO_BATCH_ELEMENTS // max(n_guru, 1)))
+    chunks = [len(c) for c in np.array_split(np.arange(n_samples), max(1, n_jobs)) if len(c)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    
+    if len(chunks) == 1:
+        return _monte_carlo_worker(
+            kriteria_matrix, sub_blocks, scores, chunks[0], sigma, batch_size, seeds[0], tracked
+        )
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        futures = [
+            executor.submit(
+                _monte_carlo_worker, kriteria_matrix, sub_blocks, scores, size, sigma, batch_size, child, tracked
+            )
+            for size, child in zip(chunks, seeds)
+        ]
+        results = [f.result() for f in futures]
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+def summarize_rank_distribution(rank_counts, rank_sum, n_samples, top_k=10):
+    """
+    Ringkasan distribusi peringkat per guru. Persentil yang berada di luar posisi
+    yang dicatat (rank_counts hanya mencakup peringkat teratas) bernilai NaN.
+    Return:
+        DataFrame (urut indeks guru): rata-rata, median, persentil 5-95 peringkat, peluang top-k
+    """
+    tracked = rank_counts.shape[1]
+    cumulative = np.cumsum(rank_counts, axis=1) / n_samples
+    
+    def percentile(q):
+        position = (cumulative < q).sum(axis=1) + 1
+        return np.where(position <= tracked, position, np.nan)
+    
+    return pd.DataFrame({
+        'rata_rata_peringkat': rank_sum / n_samples,
+        'median_peringkat': percentile(0.5),
+        'peringkat_p5': percentile(0.05),
+        'peringkat_p95': percentile(0.95),
+        f'peluang_top_{top_k}': rank_counts[:, :top_k].sum(axis=1) / n_samples
+    })
+
+def monte_carlo_ranking(n_samples=10000, sigma=0.2, top_k=10, aggregate="latest", n_jobs=1, seed=0):
+    """
+    Perankingan dengan ketidakpastian penilaian perbandingan (Monte Carlo).
+    Setiap sampel memakai matriks kriteria dan subkriteria yang diberi noise
+    log-normal, diselesaikan per batch, lalu seluruh guru diranking ulang.
+    Return:
+        DataFrame ringkasan per guru (urut peringkat saat ini), None jika data belum lengkap
+    """
+    kriteria = get_data("kriteria", columns=["id_kriteria"])
+    kriteria_weights, _ = get_kriteria_weights()
+    if not kriteria_weights:
+        return None
+    kriteria_matrix = build_kriteria_matrix(
+        len(kriteria),
+        get_data("perbandingan_kriteria", columns=["id_kriteria1", "id_kriteria2", "nilai_perbandingan"])
+    )
+    subkriteria_weights, _ = get_subkriteria_weights()
+    kriteria_ids, sub_ids, _ = build_weight_matrix(kriteria_weights, subkriteria_weights)
+    
+    sub_position = {id_sub: pos for pos, id_sub in enumerate(sub_ids)}
+    sub_blocks = [
+        (
+            kriteria_ids.index(id_kriteria),
+            entry['matrix'],
+            [sub_position[id_sub] for id_sub in entry['weights']]
+        )
+        for id_kriteria, entry in subkriteria_weights.items()
+        if id_kriteria in kriteria_ids
+    ]
+    
+    tahun_aktif = get_aktif_tahun_ajaran()
+    id_tahun_ajaran = tahun_aktif['id_tahun_ajaran'] if tahun_aktif else None
+    guru_columns = ["id_guru", "nama_guru", "nip"]
+    if id_tahun_ajaran is not None:
+        guru_list = get_data("guru", columns=guru_columns, where="id_tahun_ajaran = %s", params=(id_tahun_ajaran,))
+    else:
+        guru_list = get_data("guru", columns=guru_columns)
+    if not guru_list:
+        return None
+    
+    guru_ids = [guru['id_guru'] for guru in guru_list]
+    scores = build_score_matrix(
+        guru_ids, sub_ids, get_nilai_ranking(id_tahun_ajaran, aggregate=aggregate)
+    )
+    
+    rank_counts, rank_sum = simulate_rank_distribution(
+        kriteria_matrix, sub_blocks, scores, n_samples=n_samples, sigma=sigma, n_jobs=n_jobs, seed=seed,
+        tracked=max(top_k, MONTE_CARLO_TRACKED_RANKS)
+    )
+    summary = summarize_rank_distribution(rank_counts, rank_sum, n_samples, top_k=top_k)
+    
+    base_scores = scores @ build_weight_matrix(kriteria_weights, subkriteria_weights)[2].sum(axis=1)
+    summary.insert(0, 'id_guru', guru_ids)
+    summary.insert(1, 'nama_guru', [guru['nama_guru'] for guru in guru_list])
+    summary.insert(2, 'nip', [guru['nip'] for guru in guru_list])
+    summary.insert(3, 'total_score', base_scores)
+    summary.insert(4, 'Peringkat', pd.Series(base_scores).rank(ascending=False, method='min').astype(int))
+    
+    return summary.sort_values('Peringkat', kind='stable').reset_index(drop=True)
+
+def calculate_ranking(aggregate="latest", start_date=None, end_date=None):
     """
     Menghitung perankingan guru berdasarkan:
     - Bobot kriteria
     - Bobot subkriteria
-    - Nilai subkriteria setiap guru
+    - Nilai subkriteria setiap guru (satu nilai per subkriteria, lihat get_nilai_ranking)
     Return:
         DataFrame hasil perankingan
         CR kriteria
         CR subkriteria
     """
-    from database import get_data
-    
+    df_results, _, kriteria_cr, _, subkriteria_cr = _calculate_ranking(aggregate, start_date, end_date)
+    return df_results, kriteria_cr, subkriteria_cr
+
+def _calculate_ranking(aggregate="latest", start_date=None, end_date=None):
+    """Menghitung perankingan beserta bobot yang dipakai"""
     # 1. Hitung bobot kriteria
     kriteria_weights, kriteria_cr = get_kriteria_weights()
     if not kriteria_weights:
-        return None, None, None
+        return None, None, None, None, None
     
     # 2. Hitung bobot subkriteria
     subkriteria_weights, subkriteria_cr = get_subkriteria_weights()
     
-    # 3. Dapatkan data guru dan nilai
-    guru_list = get_data("guru")
-    nilai_subkriteria = get_data("nilai_subkriteria")
-    
-    results = []
+    # 3. Dapatkan data guru dan nilai (hanya tahun ajaran aktif jika ada)
+    tahun_aktif = get_aktif_tahun_ajaran()
+    guru_columns = ["id_guru", "nama_guru", "nip"]
+    if tahun_aktif:
+        guru_list = get_data(
+            "guru", columns=guru_columns,
+            where="id_tahun_ajaran = %s", params=(tahun_aktif['id_tahun_ajaran'],)
+        )
+    else:
+        guru_list = get_data("guru", columns=guru_columns)
+    nilai_subkriteria = get_nilai_ranking(
+        tahun_aktif['id_tahun_ajaran'] if tahun_aktif else None,
+        aggregate=aggregate,
+        start_date=start_date,
+        end_date=end_date
+    )
     
-    for guru in guru_list:
-        total_score = 0
-        detail_scores = {}
-        
-        for id_kriteria, kriteria_weight in kriteria_weights.items():
-            kriteria_score = 0
-            
-            # Jika ada subkriteria
-            if id_kriteria in subkriteria_weights:
-                for id_sub, sub_weight in subkriteria_weights[id_kriteria]['weights'].items():
-                    # Cari nilai subkriteria guru ini
-                    nilai = next(
-                        (ns['nilai'] for ns in nilai_subkriteria 
-                         if ns['id_guru'] == guru['id_guru'] and ns['id_subkriteria'] == id_sub),
-                        0  # Default nilai 0 jika tidak ada
-                    )
-                    kriteria_score += nilai * sub_weight
-            
-            total_score += kriteria_score * kriteria_weight
-            detail_scores[f"Kriteria {id_kriteria}"] = kriteria_score * kriteria_weight
-        
-        results.append({
-            'id_guru': guru['id_guru'],
-            'nama_guru': guru['nama_guru'],
-            'nip': guru['nip'],
-            'total_score': total_score,
-            **detail_scores  # Unpack detail scores
-        })
+    # 4. Hitung nilai seluruh guru dengan perkalian matriks
+    kriteria_ids, total_scores, detail_scores = calculate_scores(
+        guru_list, nilai_subkriteria, kriteria_weights, subkriteria_weights
+    )
     
-    # Urutkan berdasarkan total score
-    ranked_results = sorted(results, key=lambda x: x['total_score'], reverse=True)
+    df_results = pd.DataFrame({
+        'id_guru': [guru['id_guru'] for guru in guru_list],
+        'nama_guru': [guru['nama_guru'] for guru in guru_list],
+        'nip': [guru['nip'] for guru in guru_list],
+        'total_score': total_scores
+    })
+    for k_idx, id_kriteria in enumerate(kriteria_ids):
+        df_results[f"Kriteria {id_kriteria}"] = detail_scores[:, k_idx]
     
-    # Konversi ke DataFrame
-    df_results = pd.DataFrame(ranked_results)
+    # Urutkan berdasarkan total score (stabil untuk nilai yang sama)
+    order = np.argsort(-total_scores, kind='stable')
+    df_results = df_results.iloc[order].reset_index(drop=True)
     
     # Hitung peringkat
     df_results['Peringkat'] = df_results['total_score'].rank(ascending=False, method='min').astype(int)
     
-    return df_results, kriteria_cr, subkriteria_cr
\ No newline at end of file
+    return df_results, kriteria_weights, kriteria_cr, subkriteria_weights, subkriteria_cr
+
+def snapshot_to_ranking(snapshot):
+    """Mengubah snapshot tersimpan ke format hasil calculate_ranking"""
+    rows = []
+    for hasil in snapshot['hasil']:
+        rows.append({
+            'id_guru': hasil['id_guru'],
+            'nama_guru': hasil['nama_guru'],
+            'nip': hasil['nip'],
+            'total_score': hasil['total_nilai'],
+            **json.loads(hasil['detail_nilai'] or "{}"),
+            'Peringkat': hasil['peringkat']
+        })
+    
+    df_results = pd.DataFrame(rows)
+    subkriteria_cr = {int(k): cr for k, cr in json.loads(snapshot['cr_subkriteria']).items()}
+    info = {
+        'id_snapshot': snapshot['id_snapshot'],
+        'tanggal_hitung': snapshot['tanggal_hitung']
+    }
+    return df_results, snapshot['cr_kriteria'], subkriteria_cr, info
+
+def get_ranking(force=False, aggregate="latest", start_date=None, end_date=None):
+    """
+    Mengambil hasil perankingan tahun ajaran aktif.
+    Snapshot terakhir dipakai selama input perankingan (termasuk cara pemilihan nilai)
+    tidak berubah; selain itu (atau jika force=True) dihitung ulang dan disimpan
+    sebagai snapshot baru.
+    Return:
+        DataFrame hasil perankingan, CR kriteria, CR subkriteria, info snapshot
+    """
+    tahun_aktif = get_aktif_tahun_ajaran()
+    id_tahun_ajaran = tahun_aktif['id_tahun_ajaran'] if tahun_aktif else None
+    input_hash = get_ranking_fingerprint()
+    if input_hash:
+        input_hash = make_cache_key(input_hash, aggregate, str(start_date), str(end_date))
+    
+    if not force and input_hash:
+        snapshot = get_latest_ranking_snapshot(id_tahun_ajaran)
+        if snapshot and snapshot['input_hash'] == input_hash and snapshot['hasil']:
+            return snapshot_to_ranking(snapshot)
+    
+    df_results, kriteria_weights, kriteria_cr, subkriteria_weights, subkriteria_cr = _calculate_ranking(
+        aggregate, start_date, end_date
+    )
+    if df_results is None:
+        return None, None, None, None
+    
+    info = None
+    if input_hash:
+        id_snapshot = save_ranking_snapshot(
+            df_results, kriteria_weights, kriteria_cr, subkriteria_weights,
+            subkriteria_cr, id_tahun_ajaran, input_hash
+        )
+        if id_snapshot:
+            info = {'id_snapshot': id_snapshot, 'tanggal_hitung': datetime.now()}
+    
+    return df_results, kriteria_cr, subkriteria_cr, info
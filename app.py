@@ -1,21 +1,23 @@
 import streamlit as st
 import numpy as np
+import os
 import pandas as pd
 import re
 from streamlit_option_menu import option_menu
 from datetime import datetime
-from database import create_connection, init_database, bulk_insert, get_data
+from database import create_connection, ensure_schema, bulk_insert, get_data
 from ahp_calculations import *
-from utils.template_utils import download_guru_template, download_nilai_template
-from utils.import_utils import import_guru_data, import_nilai_data
-from utils.stats_utils import calculate_spearman_rank
 from utils.db_functions import *
+from utils import query_log
 
-# Inisialisasi database
-init_database()
+# Inisialisasi database (sekali per proses, dijaga tabel schema_version)
+ensure_schema()
 
 def display_comparison_matrix(items, comparisons, item_type):
-    """Menampilkan matriks perbandingan dalam tabel"""
+    """
+    Menampilkan matriks perbandingan dalam tabel; pasangan yang paling menyebabkan
+    inkonsistensi disorot dan dikembalikan sebagai dict {(id1, id2): saran}
+    """
     n = len(items)
     matrix = np.ones((n, n))
     item_ids = [item[f"id_{item_type}"] for item in items]
@@ -27,8 +29,44 @@ def display_comparison_matrix(items, comparisons, item_type):
         matrix[i, j] = comp["nilai_perbandingan"]
         matrix[j, i] = 1 / comp["nilai_perbandingan"]
     
+    result = calculate_ahp(matrix)
+    # Pasangan yang paling menurunkan CR jika direvisi (hanya saat matriks tidak konsisten)
+    hints = {}
+    if result['cr'] >= 0.1:
+        for c in locate_inconsistencies(matrix, result=result):
+            hints[(item_ids[c['i']], item_ids[c['j']])] = c
+    
     df = pd.DataFrame(matrix, index=item_names, columns=item_names)
-    st.dataframe(df.style.format("{:.3f}"), use_container_width=True)
+    styler = df.style.format("{:.3f}")
+    if hints:
+        marked = np.zeros((n, n), dtype=bool)
+        for c in hints.values():
+            marked[c['i'], c['j']] = marked[c['j'], c['i']] = True
+        styler = styler.apply(
+            lambda _: np.where(marked, "background-color: #ffd6d6; font-weight: bold", ""),
+            axis=None
+        )
+    st.dataframe(styler, use_container_width=True)
+    st.caption(f"CR = {result['cr']:.4f} ({check_consistency(result['cr'])})")
+    
+    if hints:
+        st.warning("Revisi pasangan berikut terlebih dahulu untuk menurunkan CR:")
+        for c in hints.values():
+            st.write(
+                f"- **{item_names[c['i']]} vs {item_names[c['j']]}**: "
+                f"{c['nilai']:.2f} → sekitar {c['saran']:.2f} "
+                f"(CR menjadi {c['cr_baru']:.4f})"
+            )
+    return hints
+
+def revision_hint(hints, id1, id2):
+    """Label dan teks bantuan slider untuk pasangan yang disarankan direvisi"""
+    c = hints.get((id1, id2))
+    if c is None:
+        return "", None
+    return "⚠️ ", f"Disarankan sekitar {c['saran']:.2f} (CR menjadi {c['cr_baru']:.4f})"
+
+
 def check_consistency(cr):
     """Memberikan penjelasan tentang consistency ratio"""
     if cr < 0.1:
@@ -37,6 +75,27 @@ def check_consistency(cr):
         return "Cukup Konsisten (0.1 ≤ CR < 0.2)"
     else:
         return "Tidak Konsisten (CR ≥ 0.2), perlu revisi perbandingan!"
+def select_guru(label, key, id_tahun_ajaran=None):
+    """Memilih guru lewat pencarian server-side (nama/NIP), bukan dari seluruh daftar guru"""
+    keyword = st.text_input("Cari Guru (awalan nama atau NIP)", key=f"{key}_cari")
+    guru_list, total = search_guru(keyword, id_tahun_ajaran)
+    
+    if not guru_list:
+        if keyword:
+            st.info("Tidak ada guru yang cocok dengan pencarian")
+        else:
+            st.warning("Belum ada data guru. Silakan tambah guru terlebih dahulu.")
+        return None
+    
+    if total > len(guru_list):
+        st.caption(f"Menampilkan {len(guru_list)} dari {total} guru, persempit pencarian untuk guru lainnya")
+    
+    return st.selectbox(
+        label,
+        guru_list,
+        format_func=lambda x: f"{x['nama_guru']} ({x['nip']})",
+        key=key
+    )
 def display_ahp_results(matrix, criteria_names):
     """Menampilkan hasil perhitungan AHP"""
     result = calculate_ahp(matrix)
@@ -67,6 +126,91 @@ def display_ahp_results(matrix, criteria_names):
     else:
         st.error("Tidak Konsisten (CR ≥ 0.1)")
 
+@st.fragment
+def comparison_editor(items, existing_comps, item_type, hints, on_save, on_reset, on_delete, matrix_key=None):
+    """
+    Slider perbandingan berpasangan dengan λ max dan CR yang diperbarui langsung.
+    Dijalankan sebagai fragment: menggeser slider hanya menjalankan ulang fungsi ini
+    dengan data yang sudah dimuat, dan solver inkremental (disimpan di session_state
+    per matriks) memperbarui vektor eigen dari hasil sebelumnya tanpa query database.
+    """
+    st.subheader("Input Perbandingan")
+    item_ids = [item[f"id_{item_type}"] for item in items]
+    n = len(items)
+    comparison_data = {}
+    
+    # Buat slider untuk setiap pasangan
+    for i in range(n):
+        for j in range(i+1, n):
+            item1 = items[i]
+            item2 = items[j]
+            
+            # Cari nilai yang sudah ada
+            existing_value = 1.0  # Default
+            for comp in existing_comps:
+                if {comp[f"id_{item_type}1"], comp[f"id_{item_type}2"]} == {item_ids[i], item_ids[j]}:
+                    existing_value = comp["nilai_perbandingan"]
+                    break
+            
+            # Input slider (pasangan yang disarankan direvisi diberi tanda)
+            mark, help_text = revision_hint(hints, item_ids[i], item_ids[j])
+            nilai = st.slider(
+                f"{mark}{item1[f'nama_{item_type}']} vs {item2[f'nama_{item_type}']}",
+                min_value=1/9.0,
+                max_value=9.0,
+                value=existing_value,
+                step=0.1,
+                format="%.1f",
+                key=f"{item_type}_{item_ids[i]}_{item_ids[j]}",
+                help=help_text
+            )
+            comparison_data[(item_ids[i], item_ids[j])] = nilai
+    
+    # Solver dibuat ulang hanya jika daftar item berubah, selain itu cukup update per elemen
+    state_key = f"incremental_ahp_{matrix_key or item_type}"
+    solver_entry = st.session_state.get(state_key)
+    if solver_entry is None or solver_entry[0] != item_ids:
+        matrix = np.ones((n, n))
+        for (id1, id2), nilai in comparison_data.items():
+            i, j = item_ids.index(id1), item_ids.index(id2)
+            matrix[i, j] = nilai
+            matrix[j, i] = 1 / nilai
+        solver_entry = (item_ids, IncrementalAHP(matrix))
+        st.session_state[state_key] = solver_entry
+    solver = solver_entry[1]
+    for (id1, id2), nilai in comparison_data.items():
+        solver.update(item_ids.index(id1), item_ids.index(id2), nilai)
+    
+    result = solver.result()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("λ max", f"{result['lambda_max']:.4f}")
+    col2.metric("CR", f"{result['cr']:.4f}")
+    col3.write(check_consistency(result['cr']))
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        submitted = st.button("💾 Simpan Perbandingan", key=f"simpan_{state_key}")
+    with col2:
+        reset = st.button("🔄 Reset", key=f"reset_{state_key}")
+    with col3:
+        delete = st.button("🗑️ Hapus", key=f"hapus_{state_key}")
+    
+    if submitted:
+        if on_save(comparison_data):
+            st.success("✅ Perbandingan berhasil disimpan!")
+            st.rerun()
+    
+    if reset:
+        if on_reset():
+            st.success("🔄 Perbandingan direset!")
+            st.rerun()
+    
+    if delete:
+        if len(existing_comps) > 0:
+            on_delete(existing_comps)
+            st.success("🗑️ Semua perbandingan dihapus!")
+            st.rerun()
+
 def show_perbandingan_kriteria_crud():
     st.header("📊 Kelola Perbandingan Kriteria")
     
@@ -80,70 +224,19 @@ def show_perbandingan_kriteria_crud():
     
     # Tampilkan matriks perbandingan
     st.subheader("Matriks Perbandingan Saat Ini")
+    hints = {}
     if existing_comps:
-        display_comparison_matrix(kriteria_list, existing_comps, "kriteria")
+        hints = display_comparison_matrix(kriteria_list, existing_comps, "kriteria")
     else:
         st.info("Belum ada data perbandingan.")
     
-    # Form untuk input perbandingan
-    st.subheader("Input Perbandingan")
-    with st.form("form_perbandingan_kriteria"):
-        comparison_data = {}
-        
-        # Buat slider untuk setiap pasangan kriteria
-        for i in range(len(kriteria_list)):
-            for j in range(i+1, len(kriteria_list)):
-                krit1 = kriteria_list[i]
-                krit2 = kriteria_list[j]
-                
-                # Cari nilai yang sudah ada
-                existing_value = 1.0  # Default
-                for comp in existing_comps:
-                    if (comp["id_kriteria1"] == krit1["id_kriteria"] and comp["id_kriteria2"] == krit2["id_kriteria"]) or \
-                       (comp["id_kriteria1"] == krit2["id_kriteria"] and comp["id_kriteria2"] == krit1["id_kriteria"]):
-                        existing_value = comp["nilai_perbandingan"]
-                        break
-                
-                # Input slider
-                nilai = st.slider(
-                    f"{krit1['nama_kriteria']} vs {krit2['nama_kriteria']}",
-                    min_value=1/9.0,
-                    max_value=9.0,
-                    value=existing_value,
-                    step=0.1,
-                    format="%.1f",
-                    key=f"kriteria_{krit1['id_kriteria']}_{krit2['id_kriteria']}"
-                )
-                comparison_data[(krit1["id_kriteria"], krit2["id_kriteria"])] = nilai
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            submitted = st.form_submit_button("💾 Simpan Perbandingan")
-        with col2:
-            reset = st.form_submit_button("🔄 Reset Semua")
-        with col3:
-            delete = st.form_submit_button("🗑️ Hapus Perbandingan")
-        
-        if submitted:
-            success = True
-            for (id1, id2), nilai in comparison_data.items():
-                if not save_perbandingan_kriteria(id1, id2, nilai):
-                    success = False
-            if success:
-                st.success("✅ Perbandingan berhasil disimpan!")
-                st.rerun()
-        
-        if reset:
-            if reset_perbandingan_kriteria():
-                st.success("🔄 Perbandingan direset!")
-                st.rerun()
-        
-        if delete:
-            if len(existing_comps) > 0:
-                for comp in existing_comps:
-                    delete_perbandingan_kriteria(comp["id_kriteria1"], comp["id_kriteria2"])
-                st.success("🗑️ Semua perbandingan dihapus!")
-                st.rerun()
+    # Input perbandingan (slider di luar form agar CR diperbarui langsung)
+    comparison_editor(
+        kriteria_list, existing_comps, "kriteria", hints,
+        on_save=save_perbandingan_kriteria_batch,
+        on_reset=reset_perbandingan_kriteria,
+        on_delete=delete_perbandingan_kriteria_batch
+    )
 
 def show_perbandingan_subkriteria_crud():
     st.header("📊 Kelola Perbandingan Subkriteria")
@@ -158,8 +251,9 @@ def show_perbandingan_subkriteria_crud():
     )
     
     subkriteria_list = get_data(
-        "subkriteria", 
-        where=f"id_kriteria={selected_kriteria['id_kriteria']}"
+        "subkriteria",
+        where="id_kriteria = %s",
+        params=(selected_kriteria['id_kriteria'],)
     )
     
     if len(subkriteria_list) < 2:
@@ -171,119 +265,78 @@ def show_perbandingan_subkriteria_crud():
     
     # Tampilkan matriks perbandingan
     st.subheader(f"Matriks Perbandingan Subkriteria ({selected_kriteria['nama_kriteria']})")
+    hints = {}
     if existing_comps:
-        display_comparison_matrix(subkriteria_list, existing_comps, "subkriteria")
+        hints = display_comparison_matrix(subkriteria_list, existing_comps, "subkriteria")
     else:
         st.info("Belum ada data perbandingan.")
     
-    # Form untuk input perbandingan
-    st.subheader("Input Perbandingan")
-    with st.form("form_perbandingan_subkriteria"):
-        comparison_data = {}
-        
-        # Buat slider untuk setiap pasangan subkriteria
-        for i in range(len(subkriteria_list)):
-            for j in range(i+1, len(subkriteria_list)):
-                sub1 = subkriteria_list[i]
-                sub2 = subkriteria_list[j]
-                
-                # Cari nilai yang sudah ada
-                existing_value = 1.0  # Default
-                for comp in existing_comps:
-                    if (comp["id_subkriteria1"] == sub1["id_subkriteria"] and comp["id_subkriteria2"] == sub2["id_subkriteria"]) or \
-                       (comp["id_subkriteria1"] == sub2["id_subkriteria"] and comp["id_subkriteria2"] == sub1["id_subkriteria"]):
-                        existing_value = comp["nilai_perbandingan"]
-                        break
-                
-                # Input slider
-                nilai = st.slider(
-                    f"{sub1['nama_subkriteria']} vs {sub2['nama_subkriteria']}",
-                    min_value=1/9.0,
-                    max_value=9.0,
-                    value=existing_value,
-                    step=0.1,
-                    format="%.1f",
-                    key=f"subkriteria_{sub1['id_subkriteria']}_{sub2['id_subkriteria']}"
-                )
-                comparison_data[(sub1["id_subkriteria"], sub2["id_subkriteria"])] = nilai
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            submitted = st.form_submit_button("💾 Simpan Perbandingan")
-        with col2:
-            reset = st.form_submit_button("🔄 Reset")
-        with col3:
-            delete = st.form_submit_button("🗑️ Hapus")
-        
-        if submitted:
-            success = True
-            for (id1, id2), nilai in comparison_data.items():
-                if not save_perbandingan_subkriteria(selected_kriteria["id_kriteria"], id1, id2, nilai):
-                    success = False
-            if success:
-                st.success("✅ Perbandingan berhasil disimpan!")
-                st.rerun()
-        
-        if reset:
-            if reset_perbandingan_subkriteria(selected_kriteria["id_kriteria"]):
-                st.success("🔄 Perbandingan direset!")
-                st.rerun()
-        
-        if delete:
-            if len(existing_comps) > 0:
-                for comp in existing_comps:
-                    delete_perbandingan_subkriteria(
-                        selected_kriteria["id_kriteria"],
-                        comp["id_subkriteria1"],
-                        comp["id_subkriteria2"]
-                    )
-                st.success("🗑️ Semua perbandingan dihapus!")
-                st.rerun()
+    # Input perbandingan (slider di luar form agar CR diperbarui langsung)
+    id_kriteria = selected_kriteria["id_kriteria"]
+    comparison_editor(
+        subkriteria_list, existing_comps, "subkriteria", hints,
+        on_save=lambda data: save_perbandingan_subkriteria_batch(id_kriteria, data),
+        on_reset=lambda: reset_perbandingan_subkriteria(id_kriteria),
+        on_delete=lambda comps: delete_perbandingan_subkriteria_batch(id_kriteria, comps),
+        matrix_key=f"subkriteria_{id_kriteria}"
+    )
+
 def calculate_total_scores():
-    kriteria_weights, kriteria_cr, kriteria_ri = get_kriteria_weights()
-    subkriteria_weights, subkriteria_cr, subkriteria_ri = get_subkriteria_weights()
-    guru_list = get_data("guru")
-    nilai_subkriteria = get_data("nilai_subkriteria")
+    kriteria_weights, kriteria_cr = get_kriteria_weights()
+    subkriteria_weights, subkriteria_cr = get_subkriteria_weights()
+    tahun_aktif = get_aktif_tahun_ajaran()
+    if tahun_aktif:
+        guru_list = get_data_guru()
+    else:
+        guru_list = get_data("guru")
+    nilai_subkriteria = get_nilai_ranking(tahun_aktif['id_tahun_ajaran'] if tahun_aktif else None)
+    
+    kriteria_ids, total_scores, detail_scores = calculate_scores(
+        guru_list, nilai_subkriteria, kriteria_weights, subkriteria_weights
+    )
     
     results = []
-    for guru in guru_list:
-        total_score = 0
-        detail_scores = {}
-        
-        for id_kriteria, kriteria_weight in kriteria_weights.items():
-            subs = subkriteria_weights.get(id_kriteria, {})
-            kriteria_score = 0
-            
-            for id_sub, sub_weight in subs.items():
-                nilai = next((ns['nilai'] for ns in nilai_subkriteria 
-                           if ns['id_guru'] == guru['id_guru'] and ns['id_subkriteria'] == id_sub), 0)
-                kriteria_score += nilai * sub_weight
-            
-            total_score += kriteria_score * kriteria_weight
-            detail_scores[f"Kriteria {id_kriteria}"] = kriteria_score * kriteria_weight
-        
+    for g_idx, guru in enumerate(guru_list):
         results.append({
             'id_guru': guru['id_guru'],
             'nama_guru': guru['nama_guru'],
             'nip': guru['nip'],
-            'total_score': total_score,
-            'detail_scores': detail_scores
+            'total_score': total_scores[g_idx],
+            'detail_scores': {
+                f"Kriteria {id_kriteria}": detail_scores[g_idx, k_idx]
+                for k_idx, id_kriteria in enumerate(kriteria_ids)
+            }
         })
     
-    return sorted(results, key=lambda x: x['total_score'], reverse=True), kriteria_cr, kriteria_ri, subkriteria_cr, subkriteria_ri
+    return sorted(results, key=lambda x: x['total_score'], reverse=True), kriteria_cr, subkriteria_cr
 
 # Fungsi-fungsi tampilan
 def show_dashboard():
     st.header("Dashboard")
     st.write("Selamat datang di Sistem AHP untuk Penilaian Kenaikan Status Guru")
     
+    tahun_aktif = get_aktif_tahun_ajaran()
+    stats = get_dashboard_stats(tahun_aktif['id_tahun_ajaran'] if tahun_aktif else None)
+    if not stats:
+        st.warning("Statistik belum dapat dimuat")
+        return
+    
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Jumlah Guru", len(get_data("guru")))
+        st.metric("Jumlah Guru", stats['jumlah_guru'])
     with col2:
-        st.metric("Jumlah Kriteria", len(get_data("kriteria")))
+        st.metric("Jumlah Kriteria", stats['jumlah_kriteria'])
     with col3:
-        st.metric("Jumlah Subkriteria", len(get_data("subkriteria")))
+        st.metric("Jumlah Subkriteria", stats['jumlah_subkriteria'])
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Guru Sudah Dinilai", stats['guru_dinilai'])
+    with col2:
+        st.metric("Guru Belum Dinilai", stats['guru_belum_dinilai'])
+    with col3:
+        terakhir = stats['perhitungan_terakhir']
+        st.metric("Perangkingan Terakhir", terakhir.strftime('%d/%m/%Y %H:%M') if terakhir else "-")
 
 def show_tahun_ajaran_management():
     st.header("🎓 Manajemen Tahun Ajaran")
@@ -396,8 +449,23 @@ def show_guru_management():
     with tab1:
         st.subheader("Daftar Guru")
         
-        # Dapatkan data guru dari database
-        guru_list = get_data("guru")
+        # Cari dan ambil satu halaman data guru dari database
+        tahun_aktif = get_aktif_tahun_ajaran()
+        id_tahun_ajaran = tahun_aktif['id_tahun_ajaran'] if tahun_aktif else None
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            keyword = st.text_input("Cari Guru (awalan nama atau NIP)", key="guru_cari")
+        with col2:
+            halaman = st.number_input("Halaman", min_value=1, value=1, step=1, key="guru_halaman")
+        
+        guru_list, total = search_guru(
+            keyword,
+            id_tahun_ajaran,
+            limit=GURU_PAGE_SIZE,
+            offset=(int(halaman) - 1) * GURU_PAGE_SIZE
+        )
+        jumlah_halaman = max(1, -(-total // GURU_PAGE_SIZE))
         
         if guru_list:
             # Buat DataFrame untuk tampilan yang lebih baik
@@ -405,8 +473,9 @@ def show_guru_management():
             
             # Tampilkan tabel dengan opsi edit/hapus
             st.dataframe(df, use_container_width=True)
+            st.caption(f"Halaman {int(halaman)} dari {jumlah_halaman} ({total} guru)")
             
-            # Opsi untuk menghapus guru
+            # Opsi untuk menghapus guru (dari halaman yang sedang ditampilkan)
             st.markdown("### Hapus Data Guru")
             guru_to_delete = st.selectbox(
                 "Pilih Guru yang Akan Dihapus",
@@ -421,6 +490,10 @@ def show_guru_management():
                     st.success(f"Guru {guru_to_delete[1]} berhasil dihapus")
                 else:
                     st.error("Gagal menghapus data guru")
+        elif total:
+            st.info(f"Halaman {int(halaman)} kosong, data guru hanya {jumlah_halaman} halaman")
+        elif keyword:
+            st.info("Tidak ada guru yang cocok dengan pencarian")
         else:
             st.warning("Belum ada data guru yang tersimpan")
     
@@ -455,6 +528,7 @@ def show_guru_management():
                     }
                     
                     if save_data("guru", guru_data):
+                        invalidate_data_version()
                         st.success("Data guru berhasil disimpan!")
                         st.balloons()
                         st.experimental_rerun()
@@ -468,6 +542,8 @@ def show_guru_management():
         st.markdown("### Download Template")
         if st.button("Generate Template"):
             try:
+                from utils.template_utils import download_guru_template
+                
                 subkriteria_list = get_data("subkriteria")
                 template_path = download_guru_template(subkriteria_list)
                 
@@ -491,6 +567,8 @@ def show_guru_management():
         
         if uploaded_file:
             try:
+                from utils.import_utils import import_guru_data
+                
                 # Proses import data
                 data_list = import_guru_data(uploaded_file)
                 
@@ -501,6 +579,7 @@ def show_guru_management():
                 # Konfirmasi simpan
                 if st.button("Simpan ke Database"):
                     if bulk_insert("guru", data_list):
+                        invalidate_data_version()
                         st.success(f"Berhasil menyimpan {len(data_list)} data guru")
                         st.session_state.refresh = True
                     else:
@@ -536,8 +615,9 @@ def show_kriteria_management():
                         'nama_kriteria': nama,
                         'deskripsi': deskripsi
                     }
-                    save_data("kriteria", data)
-                    st.success("Data kriteria berhasil disimpan")
+                    if save_data("kriteria", data):
+                        invalidate_data_version()
+                        st.success("Data kriteria berhasil disimpan")
                 else:
                     st.error("Nama kriteria wajib diisi")
     
@@ -553,7 +633,9 @@ def show_kriteria_management():
                 format_func=lambda x: x['nama_kriteria']
             )
             
-            subkriteria_list = get_data("subkriteria", where=f"id_kriteria={selected_kriteria['id_kriteria']}")
+            subkriteria_list = get_data(
+                "subkriteria", where="id_kriteria = %s", params=(selected_kriteria['id_kriteria'],)
+            )
             if subkriteria_list:
                 df = pd.DataFrame(subkriteria_list)
                 st.dataframe(df)
@@ -572,8 +654,9 @@ def show_kriteria_management():
                             'nama_subkriteria': nama_sub,
                             'deskripsi': deskripsi_sub
                         }
-                        save_data("subkriteria", data)
-                        st.success("Subkriteria berhasil ditambahkan")
+                        if save_data("subkriteria", data):
+                            invalidate_data_version()
+                            st.success("Subkriteria berhasil ditambahkan")
                     else:
                         st.error("Nama subkriteria wajib diisi")
 
@@ -649,87 +732,54 @@ def show_penilaian():
     
     with tab1:
         # Kode input manual yang sudah ada
-        guru_list = get_data("guru")
-        if not guru_list:
-            st.warning("Belum ada data guru. Silakan tambah guru terlebih dahulu.")
-            return
-        
-        selected_guru = st.selectbox(
-            "Pilih Guru",
-            guru_list,
-            format_func=lambda x: f"{x['nama_guru']} ({x['nip']})",
-            key="select_guru_penilaian"
-        )
-        
-        kriteria_list = get_data("kriteria")
-        if not kriteria_list:
-            st.warning("Belum ada kriteria yang ditentukan")
-            return
-        
-        with st.form(key="form_penilaian_guru"):
-            nilai_subkriteria = {}
-            
-            for kriteria in kriteria_list:
-                st.subheader(f"Kriteria: {kriteria['nama_kriteria']}")
-                
-                subkriteria_list = get_data(
-                    "subkriteria", 
-                    where=f"id_kriteria={kriteria['id_kriteria']}"
-                )
-                
-                if not subkriteria_list:
-                    st.warning(f"Belum ada subkriteria untuk {kriteria['nama_kriteria']}")
-                    continue
-                
-                for sub in subkriteria_list:
-                    existing_nilai = get_data(
-                        "nilai_subkriteria",
-                        where=f"id_guru={selected_guru['id_guru']} AND id_subkriteria={sub['id_subkriteria']}"
-                    )
-                    
-                    default_value = 3
-                    if existing_nilai:
-                        default_value = int(existing_nilai[0]['nilai'])
+        selected_guru = select_guru("Pilih Guru", "select_guru_penilaian", tahun_aktif['id_tahun_ajaran'])
+        # Tab lain tetap dirender walaupun belum ada guru yang dipilih
+        if not selected_guru:
+            st.info("Pilih guru untuk mengisi penilaian")
+        else:
+            kriteria_list = get_form_penilaian(selected_guru['id_guru'])
+            if not kriteria_list:
+                st.warning("Belum ada kriteria yang ditentukan")
+            else:
+                with st.form(key="form_penilaian_guru"):
+                    nilai_subkriteria = {}
                     
-                    nilai = st.number_input(
-                        f"Nilai untuk {sub['nama_subkriteria']} (1-5)",
-                        min_value=1,
-                        max_value=5,
-                        value=default_value,
-                        step=1,
-                        key=f"nilai_{sub['id_subkriteria']}"
-                    )
-                    nilai_subkriteria[sub['id_subkriteria']] = int(nilai)
-            
-            submitted = st.form_submit_button("Simpan Penilaian")
-            if submitted:
-                for sub_id, nilai in nilai_subkriteria.items():
-                    existing = get_data(
-                        "nilai_subkriteria",
-                        where=f"id_guru={selected_guru['id_guru']} AND id_subkriteria={sub_id}"
-                    )
+                    for kriteria in kriteria_list:
+                        st.subheader(f"Kriteria: {kriteria['nama_kriteria']}")
+                        
+                        subkriteria_list = kriteria['subkriteria']
+                        
+                        if not subkriteria_list:
+                            st.warning(f"Belum ada subkriteria untuk {kriteria['nama_kriteria']}")
+                            continue
+                        
+                        for sub in subkriteria_list:
+                            default_value = 3
+                            if sub['id_nilai'] is not None:
+                                default_value = int(sub['nilai'])
+                            
+                            nilai = st.number_input(
+                                f"Nilai untuk {sub['nama_subkriteria']} (1-5)",
+                                min_value=1,
+                                max_value=5,
+                                value=default_value,
+                                step=1,
+                                key=f"nilai_{sub['id_subkriteria']}"
+                            )
+                            nilai_subkriteria[sub['id_subkriteria']] = int(nilai)
                     
-                    if existing:
-                        update_data(
-                            "nilai_subkriteria",
-                            {'nilai': nilai, 'tanggal_penilaian': datetime.now().date()},
-                            f"id_nilai={existing[0]['id_nilai']}"
-                        )
-                    else:
-                        data = {
-                            'id_guru': selected_guru['id_guru'],
-                            'id_subkriteria': sub_id,
-                            'nilai': nilai,
-                            'tanggal_penilaian': datetime.now().date()
-                        }
-                        save_data("nilai_subkriteria", data)
-                
-                st.success("Penilaian berhasil disimpan")
+                    submitted = st.form_submit_button("Simpan Penilaian")
+                    if submitted:
+                        if save_nilai_guru(
+                            selected_guru['id_guru'],
+                            nilai_subkriteria,
+                            datetime.now().date()
+                        ):
+                            st.success("Penilaian berhasil disimpan")
     with tab2:
         st.subheader("Import Nilai dari Excel")
         
-        # Dapatkan data referensi
-        guru_list = get_data("guru")
+        # Dapatkan data referensi (daftar guru lengkap baru dimuat saat import diproses)
         subkriteria_list = get_data("subkriteria")
         
         col1, col2 = st.columns(2)
@@ -737,10 +787,14 @@ def show_penilaian():
         with col1:
             # Download Template
             if st.button("Download Template Excel"):
+                # Template hanya berisi contoh 3 guru pertama
+                guru_list, _ = search_guru(id_tahun_ajaran=tahun_aktif['id_tahun_ajaran'], limit=3)
                 if not guru_list or not subkriteria_list:
                     st.warning("Data guru atau subkriteria belum lengkap")
                 else:
                     try:
+                        from utils.template_utils import download_nilai_template
+                        
                         template_path = download_nilai_template(guru_list, subkriteria_list)
                         with open(template_path, "rb") as f:
                             st.download_button(
@@ -762,10 +816,14 @@ def show_penilaian():
             
             if uploaded_file:
                 try:
-                    # Proses import file
-                    df = pd.read_excel(uploaded_file, sheet_name="Data_Nilai", engine='openpyxl')
+                    from utils.import_utils import import_nilai_file, read_excel_preview
+                    
+                    # Baca header dan beberapa baris pertama saja untuk preview
+                    df = read_excel_preview(uploaded_file, sheet_name="Data_Nilai", n_rows=3)
                     
-                    # Validasi
+                    # Validasi (sheet tanpa baris data dilaporkan kosong, bukan kolom hilang)
+                    if df.empty:
+                        raise ValueError("Sheet 'Data_Nilai' kosong, tidak ada data nilai untuk diimport")
                     if 'NIP' not in df.columns:
                         raise ValueError("Kolom 'NIP' tidak ditemukan")
                     
@@ -774,34 +832,26 @@ def show_penilaian():
                     
                     if st.button("Proses Import"):
                         with st.spinner("Memproses data..."):
-                            # Konversi ke format database
-                            data_nilai = []
-                            subkriteria_map = {sub['nama_subkriteria']: sub['id_subkriteria'] for sub in subkriteria_list}
-                            
-                            for _, row in df.iterrows():
-                                nip = str(row['NIP'])
-                                guru = next((g for g in guru_list if g['nip'] == nip), None)
-                                
-                                if not guru:
-                                    continue
-                                
-                                for sub in subkriteria_list:
-                                    if sub['nama_subkriteria'] in df.columns:
-                                        nilai = row[sub['nama_subkriteria']]
-                                        if pd.notna(nilai) and 1 <= nilai <= 5:
-                                            data_nilai.append({
-                                                'id_guru': guru['id_guru'],
-                                                'id_subkriteria': sub['id_subkriteria'],
-                                                'nilai': int(nilai),
-                                                'tanggal_penilaian': pd.to_datetime(row['Tanggal Penilaian']).date() if 'Tanggal Penilaian' in df.columns else datetime.now().date()
-                                            })
-                            
-                            # Simpan ke database
-                            if bulk_insert("nilai_subkriteria", data_nilai):
-                                st.success(f"Berhasil mengimport {len(data_nilai)} data nilai")
-                                st.session_state.refresh = True
-                            else:
-                                st.error("Gagal menyimpan ke database")
+                            # Konversi dan simpan ke database per potongan baris
+                            rejected = []
+                            total = import_nilai_file(
+                                uploaded_file,
+                                get_data_guru(),
+                                subkriteria_list,
+                                sheet_name="Data_Nilai",
+                                nip_col="NIP",
+                                date_col="Tanggal Penilaian",
+                                rejected=rejected
+                            )
+                            invalidate_data_version()
+                            st.success(f"Berhasil mengimport {total} data nilai")
+                            if rejected:
+                                st.warning(
+                                    f"{len(rejected)} baris tidak diimpor karena Tanggal Penilaian "
+                                    "kosong atau tidak valid"
+                                )
+                                st.dataframe(pd.DataFrame(rejected).head(50), hide_index=True)
+                            st.session_state.refresh = True
                 
                 except Exception as e:
                     st.error(f"Error memproses file: {str(e)}")
@@ -810,20 +860,15 @@ def show_penilaian():
         st.subheader("History Penilaian")
         
 # Pilih guru untuk melihat history
-        guru_list = get_data("guru")
-        selected_guru = st.selectbox(
-            "Pilih Guru",
-            guru_list,
-            format_func=lambda x: f"{x['nama_guru']} ({x['nip']})",
-            key="select_guru_history"
-        )
+        selected_guru = select_guru("Pilih Guru", "select_guru_history", tahun_aktif['id_tahun_ajaran'])
         
         if selected_guru:
             # Dapatkan history penilaian dengan parameter normal
             history = get_data(
                 table_name="nilai_subkriteria n JOIN subkriteria s ON n.id_subkriteria = s.id_subkriteria",
-                columns="s.nama_subkriteria, n.nilai, n.tanggal_penilaian",
-                where=f"n.id_guru = {selected_guru['id_guru']}"
+                columns=["s.nama_subkriteria", "n.nilai", "n.tanggal_penilaian"],
+                where="n.id_guru = %s",
+                params=(selected_guru['id_guru'],)
             )
             
             if history:
@@ -846,26 +891,36 @@ def show_ranking_results():
     """Menampilkan hasil perankingan guru"""
     st.title("Hasil Perangkingan Guru")
     
-    if st.button("🔄 Hitung Ulang Perangkingan", type="primary"):
-        with st.spinner("Menghitung perankingan..."):
-            df_results, kriteria_cr, subkriteria_cr = calculate_ranking()
-            
-            if df_results is None:
-                st.error("Tidak dapat menghitung perankingan. Pastikan:")
-                st.write("- Ada kriteria dan subkriteria")
-                st.write("- Ada data perbandingan berpasangan")
-                st.write("- Ada data nilai guru")
-                return
-            
-            # Simpan ke session state
-            st.session_state.ranking_results = df_results
-            st.session_state.kriteria_cr = kriteria_cr
-            st.session_state.subkriteria_cr = subkriteria_cr
+    aggregate = st.radio(
+        "Nilai yang dipakai per subkriteria",
+        options=list(RANKING_AGGREGATES),
+        format_func=lambda x: {"latest": "Penilaian terbaru", "mean": "Rata-rata semua penilaian"}[x],
+        horizontal=True,
+        key="ranking_aggregate"
+    )
+    force = st.button("🔄 Hitung Ulang Perangkingan", type="primary")
+    with st.spinner("Menghitung perankingan..."):
+        # Snapshot terakhir dipakai jika data belum berubah
+        df_results, kriteria_cr, subkriteria_cr, snapshot_info = get_ranking(force=force, aggregate=aggregate)
     
-    if 'ranking_results' not in st.session_state:
-        st.warning("Silakan klik tombol 'Hitung Ulang Perangkingan'")
+    if df_results is None:
+        st.error("Tidak dapat menghitung perankingan. Pastikan:")
+        st.write("- Ada kriteria dan subkriteria")
+        st.write("- Ada data perbandingan berpasangan")
+        st.write("- Ada data nilai guru")
         return
     
+    # Simpan ke session state
+    st.session_state.ranking_results = df_results
+    st.session_state.kriteria_cr = kriteria_cr
+    st.session_state.subkriteria_cr = subkriteria_cr
+    
+    if snapshot_info:
+        st.caption(
+            f"Hasil perhitungan versi #{snapshot_info['id_snapshot']} - "
+            f"{snapshot_info['tanggal_hitung']:%d/%m/%Y %H:%M}"
+        )
+    
     df_results = st.session_state.ranking_results
     
     # Tampilkan hasil utama
@@ -876,7 +931,9 @@ def show_ranking_results():
     detail_cols = [col for col in df_results.columns if col.startswith('Kriteria')]
     
     # Tab untuk tampilan berbeda
-    tab1, tab2 = st.tabs(["Tampilan Utama", "Detail Penilaian"])
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "Tampilan Utama", "Detail Penilaian", "Analisis Sensitivitas", "Simulasi Monte Carlo"
+    ])
     
     with tab1:
         # Tampilkan tabel utama
@@ -910,6 +967,12 @@ def show_ranking_results():
             mime="text/csv"
         )
     
+    with tab3:
+        show_sensitivity_analysis(df_results)
+    
+    with tab4:
+        show_monte_carlo(aggregate)
+    
     # Tampilkan informasi konsistensi
     st.subheader("Analisis Konsistensi")
     
@@ -925,10 +988,142 @@ def show_ranking_results():
     
     # Tampilkan detail CR subkriteria
     with st.expander("Detail Konsistensi Subkriteria"):
+        nama_kriteria = {
+            k['id_kriteria']: k['nama_kriteria']
+            for k in get_data("kriteria", columns=["id_kriteria", "nama_kriteria"])
+        }
         for id_kriteria, cr in st.session_state.subkriteria_cr.items():
-            kriteria = next((k for k in get_data("kriteria") if k['id_kriteria'] == id_kriteria), None)
-            if kriteria:
-                st.write(f"- {kriteria['nama_kriteria']}: CR = {cr:.4f} ({check_consistency(cr)})")
+            if id_kriteria in nama_kriteria:
+                st.write(f"- {nama_kriteria[id_kriteria]}: CR = {cr:.4f} ({check_consistency(cr)})")
+def show_sensitivity_analysis(df_results):
+    """Grafik perubahan nilai terhadap bobot kriteria, ambang pertukaran peringkat, dan stabilitas"""
+    kriteria_weights, _ = get_kriteria_weights()
+    kriteria_ids, weights, contributions = ranking_contributions(df_results, kriteria_weights)
+    if not kriteria_ids or len(df_results) < 2:
+        st.info("Analisis sensitivitas membutuhkan minimal 1 kriteria dan 2 guru")
+        return
+    
+    result = weight_sensitivity(contributions, weights)
+    nama_kriteria = {
+        k['id_kriteria']: k['nama_kriteria']
+        for k in get_data("kriteria", columns=["id_kriteria", "nama_kriteria"])
+    }
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        k_idx = st.selectbox(
+            "Kriteria yang bobotnya diubah",
+            options=list(range(len(kriteria_ids))),
+            format_func=lambda i: f"{nama_kriteria.get(kriteria_ids[i], kriteria_ids[i])} (bobot {weights[i]:.3f})",
+            key="sensitivitas_kriteria"
+        )
+    with col2:
+        # Slider membutuhkan min < max, dengan 2 guru seluruh guru langsung ditampilkan
+        if len(df_results) <= 2:
+            top_n = len(df_results)
+        else:
+            top_n = st.slider("Jumlah guru teratas", 2, min(20, len(df_results)), min(10, len(df_results)),
+                              key="sensitivitas_top_n")
+    
+    # Nilai total guru teratas terhadap bobot kriteria terpilih
+    top = result['order'][:top_n]
+    chart_df = pd.DataFrame(
+        result['totals'][k_idx][:, top],
+        index=pd.Index(result['grid'], name="Bobot kriteria"),
+        columns=[f"{result['base_rank'][i]}. {df_results['nama_guru'].iloc[i]}" for i in top]
+    )
+    st.line_chart(chart_df)
+    st.caption(f"Bobot saat ini: {weights[k_idx]:.3f}; bobot kriteria lain dinormalisasi ulang secara proporsional")
+    
+    # Ambang bobot saat guru peringkat berdekatan bertukar posisi
+    swap = result['swap_weight'][k_idx]
+    pairs = np.flatnonzero(~np.isnan(swap))
+    if len(pairs):
+        order = result['order']
+        names = df_results['nama_guru'].to_numpy()
+        swap_df = pd.DataFrame({
+            'Peringkat': result['base_rank'][order[pairs]],
+            'Guru': names[order[pairs]],
+            'Bertukar dengan': names[order[pairs + 1]],
+            'Bobot Tukar': swap[pairs],
+            'Perubahan Bobot': swap[pairs] - weights[k_idx]
+        }).sort_values('Perubahan Bobot', key=np.abs)
+        st.markdown("**Ambang Pertukaran Peringkat**")
+        st.dataframe(
+            swap_df.style.format({'Bobot Tukar': "{:.3f}", 'Perubahan Bobot': "{:+.3f}"}),
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.success("Tidak ada pertukaran peringkat berdekatan untuk bobot 0 sampai 1 pada kriteria ini")
+    
+    # Stabilitas per guru terhadap seluruh kriteria
+    st.markdown("**Stabilitas Peringkat per Guru**")
+    stability_df = pd.DataFrame({
+        'Peringkat': df_results['Peringkat'],
+        'Nama Guru': df_results['nama_guru'],
+        'Stabilitas': result['stability'],
+        'Perubahan Bobot Terkecil': np.where(np.isinf(result['nearest_swap']), np.nan, result['nearest_swap'])
+    })
+    st.dataframe(
+        stability_df.style.format({'Stabilitas': "{:.0%}", 'Perubahan Bobot Terkecil': "{:.3f}"}, na_rep="-"),
+        use_container_width=True,
+        hide_index=True
+    )
+    st.caption(
+        "Stabilitas: persentase titik grid (seluruh kriteria) dengan peringkat guru tetap. "
+        "Perubahan bobot terkecil: perubahan bobot satu kriteria yang membuat guru bertukar dengan tetangganya."
+    )
+
+def show_monte_carlo(aggregate):
+    """Simulasi ketidakpastian penilaian perbandingan: distribusi peringkat dan peluang top-k"""
+    st.caption(
+        "Setiap sampel memberi noise log-normal pada seluruh nilai perbandingan kriteria dan "
+        "subkriteria, menghitung ulang bobot, lalu meranking ulang seluruh guru."
+    )
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        n_samples = st.number_input("Jumlah sampel", 1000, 100000, 10000, step=1000, key="mc_samples")
+    with col2:
+        sigma = st.slider("Noise (sigma log)", 0.05, 1.0, 0.2, step=0.05, key="mc_sigma")
+    with col3:
+        top_k = st.number_input("Top-k", 1, 100, 10, key="mc_top_k")
+    with col4:
+        parallel = st.checkbox("Paralel (multi-proses)", key="mc_parallel")
+    
+    # Hasil disimpan bersama versi data dan parameternya, hasil lama dibuang jika data berubah
+    cache_key = (get_ranking_fingerprint(), int(n_samples), sigma, int(top_k), aggregate)
+    if st.button("Jalankan Simulasi", key="mc_run"):
+        with st.spinner("Menjalankan simulasi..."):
+            st.session_state.monte_carlo = (cache_key, monte_carlo_ranking(
+                n_samples=int(n_samples),
+                sigma=sigma,
+                top_k=int(top_k),
+                aggregate=aggregate,
+                n_jobs=(os.cpu_count() or 1) if parallel else 1
+            ))
+    
+    cached = st.session_state.get("monte_carlo")
+    summary = cached[1] if cached is not None and cached[0] == cache_key else None
+    if summary is None:
+        st.info("Atur parameter lalu jalankan simulasi")
+        return
+    
+    top_col = next(col for col in summary.columns if col.startswith("peluang_top_"))
+    st.bar_chart(summary.head(20).set_index('nama_guru')[top_col])
+    st.dataframe(
+        summary.drop(columns=['id_guru']).style.format({
+            'total_score': "{:.4f}",
+            'rata_rata_peringkat': "{:.2f}",
+            'median_peringkat': "{:.0f}",
+            'peringkat_p5': "{:.0f}",
+            'peringkat_p95': "{:.0f}",
+            top_col: "{:.1%}"
+        }, na_rep=f"> {max(int(top_k), MONTE_CARLO_TRACKED_RANKS)}"),
+        use_container_width=True,
+        hide_index=True
+    )
+
 def download_template():
     """Membuat template file Excel untuk import data"""
     # Buat template untuk import guru
@@ -973,6 +1168,101 @@ def download_template():
     return template_path
 
 # Main Application
+# Jumlah rerun terakhir yang ringkasan query-nya disimpan per sesi
+QUERY_LOG_RUNS = 20
+
+def save_query_summary(page):
+    """Menyimpan ringkasan query rerun ini ke session state untuk halaman diagnostik"""
+    queries = query_log.get_rerun_queries()
+    runs = st.session_state.setdefault("query_log_runs", [])
+    runs.append({
+        "waktu": datetime.now().strftime("%H:%M:%S"),
+        "halaman": page,
+        "jumlah_query": len(queries),
+        "total_ms": sum(q["ms"] for q in queries),
+        "ringkasan": query_log.summarize(queries)
+    })
+    del runs[:-QUERY_LOG_RUNS]
+
+def show_diagnostics():
+    """Halaman tersembunyi (?halaman=diagnostik): ringkasan query per rerun dan slow-query log"""
+    st.header("Diagnostik Query Database")
+    
+    runs = st.session_state.get("query_log_runs", [])
+    if not runs:
+        st.info("Belum ada rerun yang tercatat. Buka halaman lain lalu kembali ke halaman ini.")
+    else:
+        st.dataframe(
+            pd.DataFrame([{k: v for k, v in run.items() if k != "ringkasan"} for run in reversed(runs)]),
+            use_container_width=True
+        )
+        
+        idx = st.selectbox(
+            "Detail rerun",
+            options=list(range(len(runs)))[::-1],
+            format_func=lambda i: f"{runs[i]['waktu']} - {runs[i]['halaman']} ({runs[i]['jumlah_query']} query)",
+            key="diagnostik_run"
+        )
+        ringkasan = pd.DataFrame(runs[idx]["ringkasan"])
+        if not ringkasan.empty:
+            # Bentuk SQL yang sama dieksekusi berulang dalam satu rerun: kandidat N+1
+            berulang = ringkasan[ringkasan["count"] > 1]
+            if not berulang.empty:
+                st.warning(f"{len(berulang)} bentuk query dieksekusi berulang dalam satu rerun (kandidat N+1)")
+            st.dataframe(
+                ringkasan.style.format({"total_ms": "{:.1f}", "max_ms": "{:.1f}"}),
+                use_container_width=True
+            )
+    
+    st.subheader("Slow Query Log")
+    st.caption(f"Ambang: {query_log.SLOW_QUERY_MS:.0f} ms (AHP_SLOW_QUERY_MS), file: {query_log.SLOW_QUERY_LOG}")
+    try:
+        with open(query_log.SLOW_QUERY_LOG, encoding="utf-8") as f:
+            lines = f.readlines()[-50:]
+        st.code("".join(lines) or "(kosong)", language=None)
+    except FileNotFoundError:
+        st.info("Belum ada query yang melewati ambang")
+
+def show_profiling_sidebar(page, report):
+    """Menampilkan hotspot profiling rerun ini dan perbandingan dengan baseline di sidebar"""
+    from utils.profiling import save_baseline, diff_against_baseline
+    
+    with st.sidebar:
+        st.markdown("### Profiling")
+        if report is None:
+            st.warning("Profiler sedang dipakai sesi lain, rerun ini tidak diprofiling")
+            return
+        
+        st.caption(f"{page}: wall {report['wall_s'] * 1000:.0f} ms, CPU {report['cpu_s'] * 1000:.0f} ms")
+        st.dataframe(
+            pd.DataFrame(report['kategori'].items(), columns=["Kategori", "Detik"]),
+            hide_index=True,
+            use_container_width=True
+        )
+        st.dataframe(
+            pd.DataFrame(report['top']).style.format({"tottime": "{:.4f}", "cumtime": "{:.4f}"}),
+            hide_index=True,
+            use_container_width=True
+        )
+        
+        # Tombol menyimpan profil rerun sebelumnya, karena klik tombol memicu rerun baru
+        previous = st.session_state.get("profiling_last", {}).get(page)
+        if previous and st.button("Jadikan Baseline (rerun sebelumnya)", key="profiling_baseline"):
+            save_baseline(page, previous)
+            st.success("Baseline disimpan")
+        st.session_state.setdefault("profiling_last", {})[page] = report['file']
+        
+        diff = diff_against_baseline(page, report['file'])
+        if diff is not None:
+            with st.expander("Selisih terhadap baseline (cumtime, detik)"):
+                st.dataframe(
+                    pd.DataFrame(diff).style.format(
+                        {"baseline": "{:.4f}", "sekarang": "{:.4f}", "selisih": "{:+.4f}"}
+                    ),
+                    hide_index=True,
+                    use_container_width=True
+                )
+
 def main():
     st.set_page_config(
         page_title="Sistem AHP untuk Penilaian Kenaikan Status Guru",
@@ -980,6 +1270,8 @@ def main():
         layout="wide"
     )
     
+    query_log.start_rerun("Sidebar")
+    
     with st.sidebar:
         tahun_aktif = get_aktif_tahun_ajaran()
         if tahun_aktif:
@@ -1018,25 +1310,37 @@ def main():
                 "nav-link-selected": {"background-color": "#0d6efd"},
             }
         )
+        profiling_mode = st.toggle("Mode Profiling", key="profiling_mode")
     
     st.title("🧑‍🏫 Sistem AHP untuk Penilaian Kenaikan Status Guru")
     
-    if selected == "Dashboard":
-        show_dashboard()
-    elif selected == "Tahun Ajaran":
-        show_tahun_ajaran_management()
-    elif selected == "Manajemen Guru":
-        show_guru_management()
-    elif selected == "Manajemen Kriteria":
-        show_kriteria_management()
-    elif selected == "Perbandingan Kriteria":
-        show_perbandingan_kriteria_crud()
-    elif selected == "Perbandingan Subkriteria":
-        show_perbandingan_subkriteria_crud()
-    elif selected == "Penilaian Guru":
-        show_penilaian()
-    elif selected == "Hasil Perangkingan":
-        show_ranking_results()
+    # Halaman diagnostik tidak ada di menu, dibuka lewat URL ?halaman=diagnostik
+    if st.query_params.get("halaman") == "diagnostik":
+        show_diagnostics()
+        return
+    
+    pages = {
+        "Dashboard": show_dashboard,
+        "Tahun Ajaran": show_tahun_ajaran_management,
+        "Manajemen Guru": show_guru_management,
+        "Manajemen Kriteria": show_kriteria_management,
+        "Perbandingan Kriteria": show_perbandingan_kriteria_crud,
+        "Perbandingan Subkriteria": show_perbandingan_subkriteria_crud,
+        "Penilaian Guru": show_penilaian,
+        "Hasil Perangkingan": show_ranking_results
+    }
+    
+    query_log.set_page(selected)
+    try:
+        if profiling_mode:
+            from utils.profiling import profile_page
+            
+            _, report = profile_page(selected, pages[selected])
+            show_profiling_sidebar(selected, report)
+        else:
+            pages[selected]()
+    finally:
+        save_query_summary(selected)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,184 @@
+# benchmarks/run_benchmarks.py
+"""
+Benchmark perhitungan AHP, perankingan, import nilai, dan korelasi Spearman
+terhadap data sintetis di database pengganti (SQLite in-memory).
+
+Contoh:
+    python -m benchmarks.run_benchmarks --tiers small medium --repeat 5
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/baseline.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+import ahp_calculations
+import database
+import utils.db_functions
+import utils.stats_utils
+from utils.cache_utils import invalidate_weight_cache
+from utils.import_utils import import_nilai_data
+from benchmarks.synthetic_data import TIERS, generate_dataset, create_standin_database
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Modul yang memakai create_connection dan akan diarahkan ke database pengganti
+CONNECTION_MODULES = [database, utils.db_functions, ahp_calculations]
+
+def use_standin_database(conn):
+    """Mengarahkan seluruh create_connection ke database pengganti"""
+    for module in CONNECTION_MODULES:
+        module.create_connection = lambda: conn
+
+def build_nilai_workbook(data):
+    """Membuat file Excel import nilai (format lebar) di memori"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Data_Nilai")
+    sub_names = [sub["nama_subkriteria"] for sub in data["subkriteria"]]
+    ws.append(["nip", "tanggal_penilaian"] + sub_names)
+
+    nip_by_guru = {g["id_guru"]: g["nip"] for g in data["guru"]}
+    rows = {}
+    for n in data["nilai_subkriteria"]:
+        key = (n["id_guru"], n["tanggal_penilaian"])
+        rows.setdefault(key, {})[n["id_subkriteria"]] = n["nilai"]
+    sub_ids = [sub["id_subkriteria"] for sub in data["subkriteria"]]
+    for (id_guru, tanggal), values in rows.items():
+        ws.append([nip_by_guru[id_guru], tanggal.isoformat()] + [values.get(s) for s in sub_ids])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def time_call(func, repeat, setup=None):
+    """Menjalankan func sebanyak repeat kali dan mengembalikan statistik waktu (detik)"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.mean(timings)
+    }
+
+def benchmark_tier(tier, params, repeat, seed):
+    """Menjalankan seluruh benchmark untuk satu tier ukuran data"""
+    data = generate_dataset(seed=seed, **params)
+    conn = create_standin_database(data)
+    use_standin_database(conn)
+
+    kriteria_matrix = np.ones((params["n_kriteria"], params["n_kriteria"]))
+    for p in data["perbandingan_kriteria"]:
+        i, j = p["id_kriteria1"] - 1, p["id_kriteria2"] - 1
+        kriteria_matrix[i, j] = p["nilai_perbandingan"]
+        kriteria_matrix[j, i] = 1 / p["nilai_perbandingan"]
+
+    workbook = build_nilai_workbook(data)
+    guru_list = data["guru"]
+    subkriteria_list = data["subkriteria"]
+
+    cases = {
+        "calculate_ahp": (lambda: ahp_calculations.calculate_ahp(kriteria_matrix), None),
+        "get_kriteria_weights": (ahp_calculations.get_kriteria_weights, invalidate_weight_cache),
+        "get_subkriteria_weights": (ahp_calculations.get_subkriteria_weights, invalidate_weight_cache),
+        "calculate_ranking": (ahp_calculations.calculate_ranking, invalidate_weight_cache),
+        "monte_carlo_ranking": (lambda: ahp_calculations.monte_carlo_ranking(n_samples=5000), None),
+        "import_nilai_data": (lambda: import_nilai_data(workbook, guru_list, subkriteria_list), None),
+        "calculate_spearman_rank": (utils.stats_utils.calculate_spearman_rank, utils.stats_utils.clear_spearman_cache),
+        "calculate_spearman_rank_cached": (utils.stats_utils.calculate_spearman_rank, None),
+        "calculate_spearman_ci": (
+            lambda: utils.stats_utils.calculate_spearman_ci(n_resamples=1000),
+            utils.stats_utils.clear_spearman_cache
+        )
+    }
+
+    results = []
+    for name, (func, setup) in cases.items():
+        stats = time_call(func, repeat, setup=setup)
+        results.append({"tier": tier, "function": name, **stats})
+        print(f"{tier:>8} {name:<26} median {stats['median_s'] * 1000:10.2f} ms")
+    return results
+
+def git_revision():
+    """Mengambil commit git saat ini (jika tersedia)"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+def compare_results(current, baseline_path):
+    """Menampilkan rasio median terhadap hasil benchmark sebelumnya"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base = {(r["tier"], r["function"]): r["median_s"] for r in baseline["results"]}
+
+    rows = []
+    for r in current:
+        key = (r["tier"], r["function"])
+        if key in base and base[key] > 0:
+            rows.append({
+                "tier": r["tier"],
+                "function": r["function"],
+                "baseline_ms": base[key] * 1000,
+                "current_ms": r["median_s"] * 1000,
+                "ratio": r["median_s"] / base[key]
+            })
+    if rows:
+        print(pd.DataFrame(rows).to_string(index=False, float_format="%.3f"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Sistem AHP")
+    parser.add_argument("--tiers", nargs="+", default=list(TIERS), choices=list(TIERS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Path file JSON hasil benchmark")
+    parser.add_argument("--compare", help="File JSON hasil benchmark sebelumnya untuk dibandingkan")
+    args = parser.parse_args(argv)
+
+    results = []
+    for tier in args.tiers:
+        results.extend(benchmark_tier(tier, TIERS[tier], args.repeat, args.seed))
+
+    output = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "seed": args.seed,
+                "tiers": {tier: TIERS[tier] for tier in args.tiers}
+            },
+            "results": results
+        }, f, indent=2)
+    print(f"Hasil disimpan ke {output}")
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/startup.py
+"""
+Mengukur waktu cold start dan rerun skrip Streamlit (eksekusi top-level app.py).
+
+Koneksi database diganti koneksi perekam yang menerima semua statement
+(tanpa server MySQL), sehingga yang terukur adalah biaya import dan jumlah
+statement SQL yang dijalankan di top-level setiap rerun.
+
+Contoh:
+    python -m benchmarks.startup --reruns 20
+"""
+import argparse
+import json
+import os
+import runpy
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+class RecordingCursor:
+    """Cursor yang hanya mencatat statement dan selalu mengembalikan hasil kosong"""
+
+    def __init__(self, log):
+        self._log = log
+        self.rowcount = 0
+        self.lastrowid = None
+        self.description = None
+
+    def execute(self, sql, params=()):
+        self._log.append(sql)
+
+    def executemany(self, sql, seq_params):
+        self._log.append(sql)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self.statements)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def run_app_script(conn):
+    """Menjalankan top-level app.py seperti satu rerun Streamlit"""
+    import database
+    database.create_connection = lambda: conn
+    runpy.run_path(APP_PATH, run_name="app_startup_benchmark")
+
+def measure_in_process(reruns):
+    """Dijalankan di subprocess baru: satu cold start lalu beberapa rerun"""
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    conn = RecordingConnection()
+
+    start = time.perf_counter()
+    run_app_script(conn)
+    cold_s = time.perf_counter() - start
+    cold_statements = len(conn.statements)
+
+    rerun_times = []
+    rerun_statements = []
+    for _ in range(reruns):
+        before = len(conn.statements)
+        start = time.perf_counter()
+        run_app_script(conn)
+        rerun_times.append(time.perf_counter() - start)
+        rerun_statements.append(len(conn.statements) - before)
+
+    heavy_modules = ["scipy", "seaborn", "matplotlib", "openpyxl"]
+    return {
+        "cold_start_s": cold_s,
+        "cold_start_statements": cold_statements,
+        "rerun_median_s": statistics.median(rerun_times) if rerun_times else None,
+        "rerun_statements": statistics.median(rerun_statements) if rerun_statements else None,
+        "heavy_modules_loaded": [m for m in heavy_modules if m in sys.modules]
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cold start dan rerun app.py")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--output", help="Path file JSON hasil pengukuran")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_in_process(args.reruns)))
+        return
+
+    # Cold start diukur di proses baru agar tidak ada modul yang sudah ter-cache
+    output = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.startup", "--child", "--reruns", str(args.reruns)],
+        cwd=os.path.dirname(APP_PATH),
+        text=True
+    )
+    result = json.loads(output.strip().splitlines()[-1])
+    for key, value in result.items():
+        print(f"{key:<24} {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# benchmarks/synthetic_data.py
+"""
+Generator data sintetis dan database pengganti (SQLite in-memory)
+untuk mengukur performa perhitungan AHP tanpa server MySQL
+"""
+import sqlite3
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+
+SAATY_SCALE = np.array([1/9, 1/8, 1/7, 1/6, 1/5, 1/4, 1/3, 1/2, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+
+# Ukuran data per tier benchmark
+TIERS = {
+    "small": {
+        "n_tahun_ajaran": 1, "n_guru": 50, "n_kriteria": 4,
+        "n_subkriteria": 3, "n_penilaian": 1
+    },
+    "medium": {
+        "n_tahun_ajaran": 3, "n_guru": 500, "n_kriteria": 6,
+        "n_subkriteria": 5, "n_penilaian": 2
+    },
+    "large": {
+        "n_tahun_ajaran": 5, "n_guru": 2000, "n_kriteria": 8,
+        "n_subkriteria": 8, "n_penilaian": 3
+    }
+}
+
+SCHEMA = [
+    """CREATE TABLE tahun_ajaran (
+        id_tahun_ajaran INTEGER PRIMARY KEY AUTOINCREMENT,
+        tahun TEXT NOT NULL, periode TEXT NOT NULL, semester TEXT NOT NULL,
+        is_aktif BOOLEAN DEFAULT FALSE, tanggal_mulai DATE, tanggal_selesai DATE
+    )""",
+    """CREATE TABLE guru (
+        id_tahun_ajaran INTEGER, id_guru INTEGER PRIMARY KEY AUTOINCREMENT,
+        nama_guru TEXT NOT NULL, nip TEXT NOT NULL, jabatan TEXT, tanggal_masuk DATE
+    )""",
+    """CREATE TABLE kriteria (
+        id_kriteria INTEGER PRIMARY KEY AUTOINCREMENT,
+        nama_kriteria TEXT NOT NULL, deskripsi TEXT
+    )""",
+    """CREATE TABLE subkriteria (
+        id_subkriteria INTEGER PRIMARY KEY AUTOINCREMENT, id_kriteria INTEGER NOT NULL,
+        nama_subkriteria TEXT NOT NULL, deskripsi TEXT
+    )""",
+    """CREATE TABLE nilai_subkriteria (
+        id_nilai INTEGER PRIMARY KEY AUTOINCREMENT, id_guru INTEGER NOT NULL,
+        id_subkriteria INTEGER NOT NULL, nilai FLOAT NOT NULL, tanggal_penilaian DATE,
+        UNIQUE (id_guru, id_subkriteria, tanggal_penilaian)
+    )""",
+    """CREATE TABLE perbandingan_kriteria (
+        id_perbandingan INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_kriteria1 INTEGER NOT NULL, id_kriteria2 INTEGER NOT NULL,
+        nilai_perbandingan FLOAT NOT NULL, UNIQUE (id_kriteria1, id_kriteria2)
+    )""",
+    """CREATE TABLE perbandingan_subkriteria (
+        id_perbandingan INTEGER PRIMARY KEY AUTOINCREMENT, id_kriteria INTEGER NOT NULL,
+        id_subkriteria1 INTEGER NOT NULL, id_subkriteria2 INTEGER NOT NULL,
+        nilai_perbandingan FLOAT NOT NULL, UNIQUE (id_kriteria, id_subkriteria1, id_subkriteria2)
+    )""",
+    """CREATE TABLE hasil_ahp (
+        id_hasil INTEGER PRIMARY KEY AUTOINCREMENT, id_guru INTEGER NOT NULL,
+        total_nilai FLOAT NOT NULL, tanggal_hitung DATETIME
+    )"""
+]
+
+def random_comparisons(n, rng, noise=0.3):
+    """
+    Membuat perbandingan berpasangan (segitiga atas) yang mendekati konsisten:
+    rasio bobot acak diberi noise log-normal lalu dibulatkan ke skala Saaty
+    """
+    weights = rng.uniform(1, 9, size=n)
+    comparisons = []
+    for i in range(n):
+        for j in range(i + 1, n):
+            ratio = weights[i] / weights[j] * np.exp(rng.normal(0, noise))
+            nilai = SAATY_SCALE[np.argmin(np.abs(np.log(SAATY_SCALE) - np.log(ratio)))]
+            comparisons.append((i, j, float(nilai)))
+    return comparisons
+
+def generate_dataset(n_tahun_ajaran=1, n_guru=50, n_kriteria=4, n_subkriteria=3,
+                     n_penilaian=1, seed=0):
+    """
+    Membuat data sintetis dengan struktur tabel yang sama seperti database aplikasi.
+    Guru diduplikasi ke setiap tahun ajaran seperti pada create_tahun_ajaran.
+    Returns:
+        dict {nama_tabel: list baris (dict)}
+    """
+    rng = np.random.default_rng(seed)
+    data = {table: [] for table in (
+        "tahun_ajaran", "guru", "kriteria", "subkriteria", "nilai_subkriteria",
+        "perbandingan_kriteria", "perbandingan_subkriteria"
+    )}
+
+    start_year = 2024 - n_tahun_ajaran
+    for t in range(n_tahun_ajaran):
+        tahun = f"{start_year + t}/{start_year + t + 1}"
+        data["tahun_ajaran"].append({
+            "id_tahun_ajaran": t + 1,
+            "tahun": tahun,
+            "periode": f"Tahun Ajaran {tahun}",
+            "semester": "Ganjil",
+            "is_aktif": t == n_tahun_ajaran - 1,
+            "tanggal_mulai": date(start_year + t, 7, 1),
+            "tanggal_selesai": date(start_year + t + 1, 6, 30)
+        })
+
+    id_sub = 0
+    for k in range(n_kriteria):
+        id_kriteria = k + 1
+        data["kriteria"].append({
+            "id_kriteria": id_kriteria,
+            "nama_kriteria": f"Kriteria {id_kriteria}",
+            "deskripsi": ""
+        })
+        first_sub = id_sub + 1
+        for s in range(n_subkriteria):
+            id_sub += 1
+            data["subkriteria"].append({
+                "id_subkriteria": id_sub,
+                "id_kriteria": id_kriteria,
+                "nama_subkriteria": f"Subkriteria {id_kriteria}.{s + 1}",
+                "deskripsi": ""
+            })
+        for i, j, nilai in random_comparisons(n_subkriteria, rng):
+            data["perbandingan_subkriteria"].append({
+                "id_kriteria": id_kriteria,
+                "id_subkriteria1": first_sub + i,
+                "id_subkriteria2": first_sub + j,
+                "nilai_perbandingan": nilai
+            })
+
+    for i, j, nilai in random_comparisons(n_kriteria, rng):
+        data["perbandingan_kriteria"].append({
+            "id_kriteria1": i + 1,
+            "id_kriteria2": j + 1,
+            "nilai_perbandingan": nilai
+        })
+
+    id_guru = 0
+    sub_ids = [sub["id_subkriteria"] for sub in data["subkriteria"]]
+    for tahun_ajaran in data["tahun_ajaran"]:
+        for g in range(n_guru):
+            id_guru += 1
+            data["guru"].append({
+                "id_tahun_ajaran": tahun_ajaran["id_tahun_ajaran"],
+                "id_guru": id_guru,
+                "nama_guru": f"Guru {g + 1}",
+                "nip": f"{19700000 + g}",
+                "jabatan": "Guru Mata Pelajaran",
+                "tanggal_masuk": date(2010, 1, 1)
+            })
+            for p in range(n_penilaian):
+                tanggal = tahun_ajaran["tanggal_mulai"] + timedelta(days=30 * (p + 1))
+                nilai = rng.integers(1, 6, size=len(sub_ids))
+                for sub_id, value in zip(sub_ids, nilai):
+                    data["nilai_subkriteria"].append({
+                        "id_guru": id_guru,
+                        "id_subkriteria": sub_id,
+                        "nilai": float(value),
+                        "tanggal_penilaian": tanggal
+                    })
+
+    return data
+
+
+class StandInCursor:
+    """Cursor SQLite dengan antarmuka mysql.connector (placeholder %s, dictionary=True)"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _translate(sql):
+        return sql.replace("%s", "?")
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._translate(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq_params):
+        self._cursor.executemany(self._translate(sql), [tuple(p) for p in seq_params])
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([d[0] for d in self._cursor.description], row))
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandInConnection:
+    """Koneksi SQLite in-memory yang dipakai bersama; close() tidak menutup database"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False, **kwargs):
+        return StandInCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        pass
+
+
+def create_standin_database(data):
+    """Memuat data sintetis ke database SQLite in-memory"""
+    conn = sqlite3.connect(":memory:", check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+    # Fungsi MySQL yang dipakai query sidik jari data (get_data_version)
+    conn.create_function("CRC32", 1, lambda value: zlib.crc32(str(value).encode("utf-8")))
+    conn.create_function("CONCAT", -1, lambda *values: "".join(str(v) for v in values))
+    conn.create_function(
+        "CONCAT_WS", -1, lambda sep, *values: sep.join(str(v) for v in values if v is not None)
+    )
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for table, rows in data.items():
+        if not rows:
+            continue
+        columns = list(rows[0].keys())
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+            [tuple(row[col] for col in columns) for row in rows]
+        )
+    conn.commit()
+    return StandInConnection(conn)
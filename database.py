@@ -1,67 +1,266 @@
+import os
+import threading
 import mysql.connector
+import streamlit as st
+from mysql.connector import pooling
+from utils.query_log import instrument_connection
 
-def get_data(table_name=None, columns="*", where="", query=None):
-    """Fungsi yang lebih fleksibel untuk query"""
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "",
+    "database": "ahp_db"
+}
+
+# Ukuran pool bisa diatur lewat environment variable (maksimal 32)
+POOL_NAME = "ahp_pool"
+POOL_SIZE = min(int(os.environ.get("AHP_DB_POOL_SIZE", 5)), pooling.CNX_POOL_MAXSIZE)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Versi struktur database; naikkan setiap kali tabel/kolom/index di init_database berubah
+SCHEMA_VERSION = 2
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# Jumlah baris per statement INSERT multi-row pada bulk_insert
+BULK_CHUNK_SIZE = 1000
+CONFLICT_POLICIES = (None, "ignore", "update")
+
+def _select_sql(table_name, columns="*", where="", order_by="", limit=None, offset=None):
+    """Menyusun SELECT dengan placeholder %s (nilai tidak pernah disisipkan ke SQL)"""
+    if not isinstance(columns, str):
+        columns = ", ".join(columns)
+    sql = f"SELECT {columns} FROM {table_name}"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        if offset:
+            sql += " OFFSET %s"
+    return sql
+
+def get_data(table_name=None, columns="*", where="", params=None, order_by="",
+             limit=None, offset=None, query=None):
+    """
+    Satu-satunya pintu query SELECT aplikasi, selalu dengan parameter binding.
+    
+    Parameters:
+        table_name: nama tabel atau ekspresi JOIN
+        columns: "*", string kolom, atau list kolom yang diambil (proyeksi)
+        where: kondisi dengan placeholder %s, contoh "id_kriteria = %s"
+        params: nilai untuk placeholder di where/query (urut)
+        order_by: klausa ORDER BY (nama kolom, bukan input pengguna)
+        limit, offset: jumlah baris maksimum dan posisi awal (paging)
+        query: SQL lengkap berplaceholder sebagai pengganti table_name/where
+    
+    Returns:
+        list baris (dict); [] jika gagal
+    """
+    params = list(params or [])
+    if query is None:
+        query = _select_sql(table_name, columns, where, order_by, limit, offset)
+        if limit is not None:
+            params.append(int(limit))
+            if offset:
+                params.append(int(offset))
+    
     conn = create_connection()
     if conn is None:
         return []
     
-    cursor = conn.cursor(dictionary=True)
-    
+    cursor = None
     try:
-        if query:
-            cursor.execute(query)
-        else:
-            sql = f"SELECT {columns} FROM {table_name}"
-            if where:
-                sql += f" WHERE {where}"
-            cursor.execute(sql)
-        
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, tuple(params))
         return cursor.fetchall()
     except Exception as e:
         print(f"Database error: {str(e)}")
+        st.error(f"Error mendapatkan data: {e}")
         return []
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+def save_data(table_name, data):
+    """Menyimpan satu baris data, mengembalikan id baris baru (None jika gagal)"""
+    conn = create_connection()
+    if conn is None:
+        return None
+    
+    cursor = conn.cursor()
+    columns = ", ".join(data.keys())
+    placeholders = ", ".join(["%s"] * len(data))
+    query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+    
+    try:
+        cursor.execute(query, tuple(data.values()))
+        conn.commit()
+        return cursor.lastrowid
+    except Exception as e:
+        print(f"Database error: {str(e)}")
+        st.error(f"Error menyimpan data: {e}")
+        conn.rollback()
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+def update_data(table_name, data, where, params=None):
+    """
+    Mengupdate data; where memakai placeholder %s dengan nilai di params
+    contoh: update_data("guru", {"jabatan": "Wali Kelas"}, "id_guru = %s", (5,))
+    """
+    conn = create_connection()
+    if conn is None:
+        return False
+    
+    cursor = conn.cursor()
+    set_clause = ", ".join([f"{key}=%s" for key in data.keys()])
+    query = f"UPDATE {table_name} SET {set_clause} WHERE {where}"
+    
+    try:
+        cursor.execute(query, tuple(data.values()) + tuple(params or ()))
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Database error: {str(e)}")
+        st.error(f"Error mengupdate data: {e}")
+        conn.rollback()
+        return False
     finally:
         cursor.close()
         conn.close()
-def bulk_insert(table_name, data_list):
-    """Insert banyak data sekaligus"""
+
+def bulk_insert(table_name, data_list, on_conflict=None, update_columns=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Insert banyak data sekaligus dengan statement multi-row VALUES per potongan.
+    
+    Parameters:
+        on_conflict: None (error jika duplikat), "ignore" (lewati baris duplikat),
+                     atau "update" (upsert berdasarkan primary/unique key)
+        update_columns: kolom yang di-update saat konflik (default: semua kolom)
+        chunk_size: jumlah baris per statement
+    """
     if not data_list:
         return False
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict harus salah satu dari {CONFLICT_POLICIES}")
     
     conn = create_connection()
     if conn is None:
         return False
     
     cursor = conn.cursor()
-    columns = ", ".join(data_list[0].keys())
-    placeholders = ", ".join(["%s"] * len(data_list[0]))
-    query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+    keys = list(data_list[0].keys())
+    columns = ", ".join(keys)
+    row_placeholder = "(" + ", ".join(["%s"] * len(keys)) + ")"
+    
+    insert = "INSERT IGNORE" if on_conflict == "ignore" else "INSERT"
+    suffix = ""
+    if on_conflict == "update":
+        suffix = " ON DUPLICATE KEY UPDATE " + ", ".join(
+            f"{col}=VALUES({col})" for col in (update_columns or keys)
+        )
     
     try:
-        cursor.executemany(query, [tuple(data.values()) for data in data_list])
+        for start in range(0, len(data_list), chunk_size):
+            chunk = data_list[start:start + chunk_size]
+            query = (
+                f"{insert} INTO {table_name} ({columns}) VALUES "
+                + ", ".join([row_placeholder] * len(chunk))
+                + suffix
+            )
+            cursor.execute(query, [data[key] for data in chunk for key in keys])
         conn.commit()
         return True
     except mysql.connector.Error as err:
+        conn.rollback()
         print(f"Error bulk insert: {err}")
         return False
     finally:
         cursor.close()
         conn.close()
+def get_pool():
+    """Mengembalikan pool koneksi yang dipakai bersama oleh seluruh proses"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+    return _pool
+
 def create_connection():
-    """Membuat koneksi ke database MySQL"""
+    """
+    Mengambil koneksi ke database MySQL dari pool.
+    Koneksi dicek (ping) sebelum diberikan dan kembali ke pool saat close().
+    Seluruh query pada koneksi ini dicatat oleh utils.query_log.
+    """
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="ahp_db"
-        )
-        return conn
+        return instrument_connection(get_pool().get_connection())
+    except mysql.connector.errors.PoolError:
+        # Pool penuh, gunakan koneksi langsung agar request tidak gagal
+        try:
+            return instrument_connection(mysql.connector.connect(**DB_CONFIG))
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return None
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return None
 
+def index_exists(cursor, table_name, index_name):
+    """Mengecek apakah index sudah ada pada tabel"""
+    cursor.execute(
+        """SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1""",
+        (table_name, index_name)
+    )
+    return len(cursor.fetchall()) > 0
+
+def ensure_unique_key(cursor, table_name, key_name, columns, primary_key):
+    """
+    Menambahkan unique key jika belum ada.
+    Baris duplikat dihapus terlebih dahulu, baris dengan ID terbesar yang disimpan.
+    """
+    if index_exists(cursor, table_name, key_name):
+        return
+    
+    join_on = " AND ".join(f"t1.{col} = t2.{col}" for col in columns)
+    cursor.execute(
+        f"""DELETE t1 FROM {table_name} t1
+        JOIN {table_name} t2 ON {join_on} AND t1.{primary_key} < t2.{primary_key}"""
+    )
+    cursor.execute(
+        f"ALTER TABLE {table_name} ADD UNIQUE KEY {key_name} ({', '.join(columns)})"
+    )
+
+def ensure_column(cursor, table_name, column_name, definition):
+    """Menambahkan kolom jika belum ada"""
+    cursor.execute(
+        """SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1""",
+        (table_name, column_name)
+    )
+    if len(cursor.fetchall()) == 0:
+        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}")
+
+def ensure_index(cursor, table_name, index_name, columns):
+    """Menambahkan index (non-unique) jika belum ada"""
+    if not index_exists(cursor, table_name, index_name):
+        cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+
 def init_database():
     """Inisialisasi struktur database"""
     conn = create_connection()
@@ -72,6 +271,12 @@ def init_database():
     
     # Buat tabel jika belum ada
     tables = [
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versi INT NOT NULL PRIMARY KEY,
+            tanggal_update DATETIME NOT NULL
+        )
+        """,
         """
         CREATE TABLE IF NOT EXISTS tahun_ajaran (
             id_tahun_ajaran INT AUTO_INCREMENT PRIMARY KEY,
@@ -117,6 +322,7 @@ def init_database():
             id_subkriteria INT NOT NULL,
             nilai FLOAT NOT NULL,
             tanggal_penilaian DATE,
+            UNIQUE KEY uq_nilai_subkriteria (id_guru, id_subkriteria, tanggal_penilaian),
             FOREIGN KEY (id_guru) REFERENCES guru(id_guru),
             FOREIGN KEY (id_subkriteria) REFERENCES subkriteria(id_subkriteria) 
         )
@@ -127,6 +333,7 @@ def init_database():
             id_kriteria1 INT NOT NULL,
             id_kriteria2 INT NOT NULL,
             nilai_perbandingan FLOAT NOT NULL,
+            UNIQUE KEY uq_perbandingan_kriteria (id_kriteria1, id_kriteria2),
             FOREIGN KEY (id_kriteria1) REFERENCES kriteria(id_kriteria),
             FOREIGN KEY (id_kriteria2) REFERENCES kriteria(id_kriteria)
         )
@@ -138,26 +345,80 @@ def init_database():
             id_subkriteria1 INT NOT NULL,
             id_subkriteria2 INT NOT NULL,
             nilai_perbandingan FLOAT NOT NULL,
+            UNIQUE KEY uq_perbandingan_subkriteria (id_kriteria, id_subkriteria1, id_subkriteria2),
             FOREIGN KEY (id_kriteria) REFERENCES kriteria(id_kriteria),
             FOREIGN KEY (id_subkriteria1) REFERENCES subkriteria(id_subkriteria),
             FOREIGN KEY (id_subkriteria2) REFERENCES subkriteria(id_subkriteria)
         )
         """,
         """
+        CREATE TABLE IF NOT EXISTS snapshot_ahp (
+            id_snapshot INT AUTO_INCREMENT PRIMARY KEY,
+            id_tahun_ajaran INT,
+            input_hash CHAR(40) NOT NULL,
+            bobot_kriteria TEXT NOT NULL, -- JSON {id_kriteria: bobot}
+            bobot_subkriteria TEXT NOT NULL, -- JSON {id_kriteria: {id_subkriteria: bobot}}
+            cr_kriteria FLOAT NOT NULL,
+            cr_subkriteria TEXT NOT NULL, -- JSON {id_kriteria: cr}
+            tanggal_hitung DATETIME NOT NULL,
+            INDEX idx_snapshot_tahun_ajaran (id_tahun_ajaran, id_snapshot),
+            FOREIGN KEY (id_tahun_ajaran) REFERENCES tahun_ajaran(id_tahun_ajaran)
+        )
+        """,
+        """
         CREATE TABLE IF NOT EXISTS hasil_ahp (
             id_hasil INT AUTO_INCREMENT PRIMARY KEY,
+            id_snapshot INT,
             id_guru INT NOT NULL,
             total_nilai FLOAT NOT NULL,
+            detail_nilai TEXT, -- JSON {"Kriteria <id>": nilai}
+            peringkat INT,
             tanggal_hitung DATETIME,
+            FOREIGN KEY (id_snapshot) REFERENCES snapshot_ahp(id_snapshot),
             FOREIGN KEY (id_guru) REFERENCES guru(id_guru)
         )
         """
     ]
     
+    # Kolom baru untuk tabel yang dibuat dengan versi skema sebelumnya
+    columns = [
+        ("hasil_ahp", "id_snapshot", "INT"),
+        ("hasil_ahp", "detail_nilai", "TEXT"),
+        ("hasil_ahp", "peringkat", "INT")
+    ]
+    
+    # Unique key untuk tabel yang dibuat sebelum key tersebut ada
+    unique_keys = [
+        ("nilai_subkriteria", "uq_nilai_subkriteria",
+         ["id_guru", "id_subkriteria", "tanggal_penilaian"], "id_nilai"),
+        ("perbandingan_kriteria", "uq_perbandingan_kriteria",
+         ["id_kriteria1", "id_kriteria2"], "id_perbandingan"),
+        ("perbandingan_subkriteria", "uq_perbandingan_subkriteria",
+         ["id_kriteria", "id_subkriteria1", "id_subkriteria2"], "id_perbandingan")
+    ]
+    
+    # Index pendukung query per tahun ajaran dan pencarian guru (nip sudah UNIQUE).
+    # Index komposit nilai_subkriteria dan tabel perbandingan sudah tersedia
+    # lewat unique key di atas.
+    indexes = [
+        ("guru", "idx_guru_tahun_ajaran", ["id_tahun_ajaran", "id_guru"]),
+        ("guru", "idx_guru_tahun_nama", ["id_tahun_ajaran", "nama_guru"]),
+        ("guru", "idx_guru_nama", ["nama_guru"])
+    ]
     
     try:
         for table in tables:
             cursor.execute(table)
+        for table_name, column_name, definition in columns:
+            ensure_column(cursor, table_name, column_name, definition)
+        for table_name, key_name, key_columns, primary_key in unique_keys:
+            ensure_unique_key(cursor, table_name, key_name, key_columns, primary_key)
+        for table_name, index_name, index_columns in indexes:
+            ensure_index(cursor, table_name, index_name, index_columns)
+        cursor.execute(
+            "INSERT IGNORE INTO schema_version (versi, tanggal_update) VALUES (%s, NOW())",
+            (SCHEMA_VERSION,)
+        )
         conn.commit()
         return True
     except mysql.connector.Error as err:
@@ -166,4 +427,35 @@ def init_database():
     finally:
         cursor.close()
         conn.close()
-        
\ No newline at end of file
+        
+
+def get_schema_version():
+    """Mengambil versi skema yang tercatat di database (0 jika belum ada)"""
+    conn = create_connection()
+    if conn is None:
+        return 0
+    
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(versi) FROM schema_version")
+        rows = cursor.fetchall()
+        return (rows[0][0] or 0) if rows else 0
+    except mysql.connector.Error:
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+def ensure_schema():
+    """
+    Menjalankan init_database paling banyak sekali per proses,
+    dan hanya jika versi skema di database lebih lama dari SCHEMA_VERSION
+    """
+    global _schema_ready
+    if _schema_ready:
+        return True
+    
+    with _schema_lock:
+        if not _schema_ready:
+            _schema_ready = get_schema_version() >= SCHEMA_VERSION or init_database()
+    return _schema_ready
@@ -0,0 +1,36 @@
+import numpy as np
+
+from ahp_calculations import simulate_rank_distribution, summarize_rank_distribution
+
+KRITERIA_MATRIX = np.array([[1, 3, 5], [1 / 3, 1, 2], [1 / 5, 1 / 2, 1]])
+SUB_MATRIX = np.array([[1, 2], [1 / 2, 1]])
+SUB_BLOCKS = [(0, SUB_MATRIX, [0, 1]), (1, SUB_MATRIX, [2, 3]), (2, SUB_MATRIX, [4, 5])]
+
+
+def _summary(scores, top_k, n_samples=2000):
+    rank_counts, rank_sum = simulate_rank_distribution(
+        KRITERIA_MATRIX, SUB_BLOCKS, scores, n_samples=n_samples, sigma=0.3, tracked=top_k
+    )
+    return summarize_rank_distribution(rank_counts, rank_sum, n_samples, top_k=top_k)
+
+
+def test_identical_teachers_get_equal_top_k_probability():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(1, 6, (8, 6)).astype(float)
+    scores[5] = scores[2] = scores.max(axis=0)
+
+    summary = _summary(scores, top_k=1)
+
+    assert summary.loc[2, "peluang_top_1"] == summary.loc[5, "peluang_top_1"] == 1.0
+    assert summary.loc[2, "rata_rata_peringkat"] == summary.loc[5, "rata_rata_peringkat"]
+
+
+def test_unscored_teachers_share_the_minimum_rank():
+    rng = np.random.default_rng(1)
+    scores = rng.integers(1, 6, (6, 6)).astype(float)
+    scores[[0, 3]] = 0.0
+
+    summary = _summary(scores, top_k=5)
+
+    assert summary.loc[0, "peluang_top_5"] == summary.loc[3, "peluang_top_5"] == 1.0
+    assert (summary.loc[[0, 3], "median_peringkat"] == 5).all()
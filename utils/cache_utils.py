@@ -0,0 +1,70 @@
+# utils/cache_utils.py
+import copy
+import functools
+import hashlib
+import threading
+import time
+
+# Cache bobot AHP dipakai bersama oleh seluruh sesi dalam satu proses
+MAX_WEIGHT_CACHE_SIZE = 256
+
+_weight_cache = {}
+_weight_cache_lock = threading.Lock()
+
+def make_cache_key(*parts):
+    """Membuat key cache dari isi data (hash SHA-1)"""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+def get_cached_weights(key):
+    """Mengambil salinan bobot dari cache, None jika belum ada"""
+    with _weight_cache_lock:
+        value = _weight_cache.get(key)
+    return copy.deepcopy(value) if value is not None else None
+
+def set_cached_weights(key, value):
+    """Menyimpan bobot ke cache"""
+    with _weight_cache_lock:
+        if len(_weight_cache) >= MAX_WEIGHT_CACHE_SIZE:
+            _weight_cache.clear()
+        _weight_cache[key] = copy.deepcopy(value)
+
+def invalidate_weight_cache():
+    """Mengosongkan cache bobot setelah data perbandingan berubah"""
+    with _weight_cache_lock:
+        _weight_cache.clear()
+
+def ttl_cache(seconds):
+    """
+    Decorator cache berumur pendek (per argumen) yang dipakai bersama seluruh sesi.
+    Fungsi hasil dekorasi memiliki method clear() untuk mengosongkan cache.
+    """
+    def decorator(func):
+        cache = {}
+        lock = threading.Lock()
+        # Dinaikkan oleh clear(); hasil yang dihitung sebelum clear() tidak disimpan
+        generation = [0]
+        
+        @functools.wraps(func)
+        def wrapper(*args):
+            with lock:
+                entry = cache.get(args)
+                started_generation = generation[0]
+            if entry is not None and time.monotonic() - entry[0] < seconds:
+                return copy.deepcopy(entry[1])
+            
+            value = func(*args)
+            # Hasil gagal (None) tidak di-cache agar langsung dicoba lagi
+            if value is not None:
+                with lock:
+                    if generation[0] == started_generation:
+                        cache[args] = (time.monotonic(), value)
+            return copy.deepcopy(value)
+        
+        def clear():
+            with lock:
+                cache.clear()
+                generation[0] += 1
+        
+        wrapper.clear = clear
+        return wrapper
+    return decorator
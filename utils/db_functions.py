@@ -1,74 +1,45 @@
 # ========== FUNGSI DATABASE ==========
-from database import create_connection, init_database, bulk_insert, get_data
+import json
+import os
+from datetime import datetime
+from database import create_connection, init_database, bulk_insert, get_data, save_data, update_data
+from utils.cache_utils import invalidate_weight_cache, make_cache_key, ttl_cache
 import streamlit as st
 
-# Fungsi-fungsi database
+# Fungsi Dashboard
+# Umur cache statistik dashboard (detik)
+DASHBOARD_CACHE_TTL = 30
 
-def get_data(table_name, columns="*", where="", order_by=""):
-    """Mengambil data dari database"""
-    conn = create_connection()
-    if conn is None:
-        return []
-    
-    cursor = conn.cursor(dictionary=True)
-    query = f"SELECT {columns} FROM {table_name}"
-    
-    if where:
-        query += f" WHERE {where}"
-    if order_by:
-        query += f" ORDER BY {order_by}"
-    
-    try:
-        cursor.execute(query)
-        return cursor.fetchall()
-    except Exception as e:
-        st.error(f"Error mendapatkan data: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
-
-def save_data(table_name, data):
-    """Menyimpan data ke database"""
-    conn = create_connection()
-    if conn is None:
+@ttl_cache(DASHBOARD_CACHE_TTL)
+def get_dashboard_stats(id_tahun_ajaran=None):
+    """
+    Mengambil seluruh statistik dashboard dengan satu query agregat
+    Args:
+        id_tahun_ajaran: batasi data guru ke tahun ajaran ini (None untuk semua)
+    Returns:
+        dict: jumlah guru, kriteria, subkriteria, guru sudah/belum dinilai,
+              dan waktu perhitungan perankingan terakhir
+    """
+    rows = get_data(
+        query="""SELECT
+            (SELECT COUNT(*) FROM guru g
+                WHERE %s IS NULL OR g.id_tahun_ajaran = %s) AS jumlah_guru,
+            (SELECT COUNT(*) FROM kriteria) AS jumlah_kriteria,
+            (SELECT COUNT(*) FROM subkriteria) AS jumlah_subkriteria,
+            (SELECT COUNT(DISTINCT n.id_guru) FROM nilai_subkriteria n
+                JOIN guru g ON g.id_guru = n.id_guru
+                WHERE %s IS NULL OR g.id_tahun_ajaran = %s) AS guru_dinilai,
+            (SELECT MAX(s.tanggal_hitung) FROM snapshot_ahp s
+                WHERE %s IS NULL OR s.id_tahun_ajaran = %s) AS perhitungan_terakhir""",
+        params=(id_tahun_ajaran,) * 6
+    )
+    if not rows:
         return None
     
-    cursor = conn.cursor()
-    columns = ", ".join(data.keys())
-    placeholders = ", ".join(["%s"] * len(data))
-    query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-    
-    try:
-        cursor.execute(query, tuple(data.values()))
-        conn.commit()
-        return cursor.lastrowid
-    except Exception as e:
-        st.error(f"Error menyimpan data: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
+    stats = rows[0]
+    stats['guru_belum_dinilai'] = stats['jumlah_guru'] - stats['guru_dinilai']
+    return stats
 
-def update_data(table_name, data, where):
-    conn = create_connection()
-    if conn is None:
-        return False
-    
-    cursor = conn.cursor()
-    set_clause = ", ".join([f"{key}=%s" for key in data.keys()])
-    query = f"UPDATE {table_name} SET {set_clause} WHERE {where}"
-    
-    try:
-        cursor.execute(query, tuple(data.values()))
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Error mengupdate data: {e}")
-        return False
-    finally:
-        cursor.close()
-        conn.close()
 
 
 # Fungsi CRUD Tahun Ajaran
@@ -107,6 +78,7 @@ def create_tahun_ajaran(tahun: str, periode: str, semester: str, tanggal_mulai:
         """, (new_id,))
         
         conn.commit()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -118,20 +90,8 @@ def create_tahun_ajaran(tahun: str, periode: str, semester: str, tanggal_mulai:
 
 def get_aktif_tahun_ajaran():
     """Mendapatkan tahun ajaran yang aktif"""
-    conn = create_connection()
-    if conn is None:
-        return None
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM tahun_ajaran WHERE is_aktif = TRUE LIMIT 1")
-        return cursor.fetchone()
-    except Exception as e:
-        st.error(f"Error: {str(e)}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+    rows = get_data("tahun_ajaran", where="is_aktif = TRUE", limit=1)
+    return rows[0] if rows else None
 
 
 
@@ -143,9 +103,101 @@ def get_data_guru():
         return []
     
     return get_data(
-        "guru", 
-        where=f"id_tahun_ajaran={tahun_aktif['id_tahun_ajaran']}"
+        "guru",
+        where="id_tahun_ajaran = %s",
+        params=(tahun_aktif['id_tahun_ajaran'],)
+    )
+
+# Jumlah guru per halaman pada daftar dan hasil pencarian guru
+GURU_PAGE_SIZE = 50
+
+def search_guru(keyword="", id_tahun_ajaran=None, limit=GURU_PAGE_SIZE, offset=0):
+    """
+    Mencari guru berdasarkan awalan nama atau NIP secara server-side (dengan paging)
+    Args:
+        keyword: awalan nama_guru atau nip (kosong untuk semua guru)
+        id_tahun_ajaran: batasi ke tahun ajaran ini (None untuk semua)
+        limit, offset: ukuran dan posisi halaman
+    Returns:
+        tuple: (list guru pada halaman ini, jumlah total guru yang cocok)
+    """
+    conditions = []
+    params = []
+    if id_tahun_ajaran is not None:
+        conditions.append("id_tahun_ajaran = %s")
+        params.append(id_tahun_ajaran)
+    keyword = (keyword or "").strip()
+    if keyword:
+        # Pencarian awalan agar index nama_guru / nip tetap terpakai
+        pattern = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append("(nama_guru LIKE %s OR nip LIKE %s)")
+        params.extend([pattern, pattern])
+    where = " AND ".join(conditions)
+    
+    count = get_data("guru", columns="COUNT(*) AS total", where=where, params=params)
+    total = count[0]['total'] if count else 0
+    if not total:
+        return [], 0
+    
+    guru_list = get_data(
+        "guru",
+        where=where,
+        params=params,
+        order_by="nama_guru, id_guru",
+        limit=limit,
+        offset=offset
     )
+    return guru_list, total
+
+# Cara memilih satu nilai per (guru, subkriteria) untuk perankingan
+RANKING_AGGREGATES = ("latest", "mean")
+
+def get_nilai_ranking(id_tahun_ajaran=None, aggregate="latest", start_date=None, end_date=None):
+    """
+    Mengambil satu nilai per (guru, subkriteria) untuk perankingan, dipilih di server:
+    - aggregate="latest": nilai dengan tanggal_penilaian terbaru (id_nilai terbesar jika sama)
+    - aggregate="mean": rata-rata seluruh nilai
+    Args:
+        id_tahun_ajaran: hanya guru pada tahun ajaran ini (None untuk semua)
+        start_date, end_date: batas tanggal_penilaian (None untuk tidak dibatasi)
+    """
+    if aggregate not in RANKING_AGGREGATES:
+        raise ValueError(f"aggregate harus salah satu dari {RANKING_AGGREGATES}")
+    
+    conditions = []
+    params = []
+    if id_tahun_ajaran is not None:
+        conditions.append("g.id_tahun_ajaran = %s")
+        params.append(id_tahun_ajaran)
+    if start_date:
+        conditions.append("n.tanggal_penilaian >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append("n.tanggal_penilaian <= %s")
+        params.append(end_date)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    if aggregate == "latest":
+        query = f"""SELECT id_guru, id_subkriteria, nilai FROM (
+                SELECT n.id_guru, n.id_subkriteria, n.nilai,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY n.id_guru, n.id_subkriteria
+                        ORDER BY n.tanggal_penilaian DESC, n.id_nilai DESC
+                    ) AS urutan
+                FROM nilai_subkriteria n
+                JOIN guru g ON g.id_guru = n.id_guru
+                {where}
+            ) terbaru
+            WHERE urutan = 1"""
+    else:
+        query = f"""SELECT n.id_guru, n.id_subkriteria, AVG(n.nilai) AS nilai
+            FROM nilai_subkriteria n
+            JOIN guru g ON g.id_guru = n.id_guru
+            {where}
+            GROUP BY n.id_guru, n.id_subkriteria"""
+    
+    return get_data(query=query, params=params)
+
 def save_guru(data):
     tahun_aktif = get_aktif_tahun_ajaran()
     if not tahun_aktif:
@@ -171,6 +223,7 @@ def save_guru(data):
             tahun_aktif['id_tahun_ajaran']
         ))
         conn.commit()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -205,6 +258,7 @@ def update_guru_data(updated_rows):
             cursor.execute(query, params)
         
         conn.commit()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -243,6 +297,7 @@ def delete_guru(guru_id):
         deleted_rows = cursor.rowcount
         
         conn.commit()
+        invalidate_data_version()
         
         if deleted_rows > 0:
             st.success(f"Data guru dengan ID {guru_id} berhasil dihapus beserta semua relasinya")
@@ -262,6 +317,99 @@ def delete_guru(guru_id):
 
 
 
+# Fungsi Penilaian Guru
+def get_form_penilaian(id_guru):
+    """
+    Mengambil seluruh kriteria, subkriteria, dan nilai guru dalam satu query
+    Returns:
+        list: kriteria beserta daftar subkriteria dan nilai yang sudah ada
+    """
+    rows = get_data(
+        query="""SELECT k.id_kriteria, k.nama_kriteria,
+                s.id_subkriteria, s.nama_subkriteria,
+                n.id_nilai, n.nilai
+            FROM kriteria k
+            LEFT JOIN subkriteria s ON s.id_kriteria = k.id_kriteria
+            LEFT JOIN nilai_subkriteria n
+                ON n.id_subkriteria = s.id_subkriteria AND n.id_guru = %s
+            ORDER BY k.id_kriteria, s.id_subkriteria,
+                n.tanggal_penilaian DESC, n.id_nilai DESC""",
+        params=(id_guru,)
+    )
+    
+    kriteria_list = []
+    kriteria_map = {}
+    sub_map = {}
+    for row in rows:
+        kriteria = kriteria_map.get(row['id_kriteria'])
+        if kriteria is None:
+            kriteria = {
+                'id_kriteria': row['id_kriteria'],
+                'nama_kriteria': row['nama_kriteria'],
+                'subkriteria': []
+            }
+            kriteria_map[row['id_kriteria']] = kriteria
+            kriteria_list.append(kriteria)
+        
+        # Ambil nilai terbaru saja (yang dipakai perankingan) jika ada beberapa nilai
+        if row['id_subkriteria'] is None or row['id_subkriteria'] in sub_map:
+            continue
+        sub = {
+            'id_subkriteria': row['id_subkriteria'],
+            'nama_subkriteria': row['nama_subkriteria'],
+            'id_nilai': row['id_nilai'],
+            'nilai': row['nilai']
+        }
+        sub_map[row['id_subkriteria']] = sub
+        kriteria['subkriteria'].append(sub)
+    
+    return kriteria_list
+
+def save_nilai_guru(id_guru, nilai_subkriteria, tanggal_penilaian):
+    """
+    Menyimpan seluruh nilai subkriteria seorang guru dalam satu transaksi.
+    Nilai di-upsert berdasarkan (id_guru, id_subkriteria, tanggal_penilaian):
+    penilaian pada tanggal yang sama diperbarui, tanggal lain menjadi riwayat baru.
+    Args:
+        id_guru: ID guru yang dinilai
+        nilai_subkriteria: dict {id_subkriteria: nilai}
+        tanggal_penilaian: tanggal penilaian
+    Returns:
+        bool: True jika berhasil, False jika gagal
+    """
+    if not nilai_subkriteria:
+        return True
+    
+    conn = create_connection()
+    if conn is None:
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        # Bentrok pada uq_nilai_subkriteria berarti nilai tanggal tersebut sudah ada
+        cursor.executemany(
+            """INSERT INTO nilai_subkriteria
+            (id_guru, id_subkriteria, nilai, tanggal_penilaian)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE nilai = VALUES(nilai)""",
+            [
+                (id_guru, sub_id, nilai, tanggal_penilaian)
+                for sub_id, nilai in nilai_subkriteria.items()
+            ]
+        )
+        conn.commit()
+        invalidate_data_version()
+        return True
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Gagal menyimpan penilaian: {str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+
 # Fungsi CRUD Perbandingan Kriteria
 def get_perbandingan_kriteria():
     """Mendapatkan semua data perbandingan kriteria"""
@@ -301,6 +449,8 @@ def save_perbandingan_kriteria(id_kriteria1, id_kriteria2, nilai):
             )
         
         conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -324,6 +474,77 @@ def delete_perbandingan_kriteria(id_kriteria1, id_kriteria2):
             (id_kriteria1, id_kriteria2, id_kriteria2, id_kriteria1)
         )
         conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
+        return True
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Gagal menghapus perbandingan: {str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+def save_perbandingan_kriteria_batch(comparison_data):
+    """
+    Menyimpan seluruh segitiga atas matriks perbandingan kriteria dalam satu transaksi
+    Args:
+        comparison_data: dict {(id_kriteria1, id_kriteria2): nilai}
+    """
+    if not comparison_data:
+        return True
+    
+    conn = create_connection()
+    if conn is None:
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        pairs = list(comparison_data.keys())
+        
+        # Hapus pasangan yang tersimpan dengan urutan terbalik
+        cursor.execute(
+            f"""DELETE FROM perbandingan_kriteria
+            WHERE (id_kriteria1, id_kriteria2) IN ({", ".join(["(%s, %s)"] * len(pairs))})""",
+            [id_ for (id1, id2) in pairs for id_ in (id2, id1)]
+        )
+        cursor.executemany(
+            """INSERT INTO perbandingan_kriteria
+            (id_kriteria1, id_kriteria2, nilai_perbandingan)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE nilai_perbandingan = VALUES(nilai_perbandingan)""",
+            [(id1, id2, nilai) for (id1, id2), nilai in comparison_data.items()]
+        )
+        conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
+        return True
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Gagal menyimpan perbandingan: {str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def delete_perbandingan_kriteria_batch(comparisons):
+    """Menghapus beberapa perbandingan kriteria sekaligus"""
+    if not comparisons:
+        return True
+    
+    conn = create_connection()
+    if conn is None:
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""DELETE FROM perbandingan_kriteria
+            WHERE id_perbandingan IN ({", ".join(["%s"] * len(comparisons))})""",
+            [comp["id_perbandingan"] for comp in comparisons]
+        )
+        conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -342,6 +563,8 @@ def reset_perbandingan_kriteria():
         cursor = conn.cursor()
         cursor.execute("DELETE FROM perbandingan_kriteria")
         conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -357,8 +580,9 @@ def reset_perbandingan_kriteria():
 def get_perbandingan_subkriteria(id_kriteria):
     """Mendapatkan perbandingan subkriteria untuk kriteria tertentu"""
     return get_data(
-        "perbandingan_subkriteria", 
-        where=f"id_kriteria={id_kriteria}"
+        "perbandingan_subkriteria",
+        where="id_kriteria = %s",
+        params=(id_kriteria,)
     )
 
 def save_perbandingan_subkriteria(id_kriteria, id_subkriteria1, id_subkriteria2, nilai):
@@ -397,6 +621,8 @@ def save_perbandingan_subkriteria(id_kriteria, id_subkriteria1, id_subkriteria2,
             )
         
         conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -406,6 +632,79 @@ def save_perbandingan_subkriteria(id_kriteria, id_subkriteria1, id_subkriteria2,
         if conn:
             conn.close()
 
+def save_perbandingan_subkriteria_batch(id_kriteria, comparison_data):
+    """
+    Menyimpan seluruh segitiga atas matriks perbandingan subkriteria dalam satu transaksi
+    Args:
+        id_kriteria: ID kriteria induk
+        comparison_data: dict {(id_subkriteria1, id_subkriteria2): nilai}
+    """
+    if not comparison_data:
+        return True
+    
+    conn = create_connection()
+    if conn is None:
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        pairs = list(comparison_data.keys())
+        
+        # Hapus pasangan yang tersimpan dengan urutan terbalik
+        cursor.execute(
+            f"""DELETE FROM perbandingan_subkriteria
+            WHERE id_kriteria = %s
+            AND (id_subkriteria1, id_subkriteria2) IN ({", ".join(["(%s, %s)"] * len(pairs))})""",
+            [id_kriteria] + [id_ for (id1, id2) in pairs for id_ in (id2, id1)]
+        )
+        cursor.executemany(
+            """INSERT INTO perbandingan_subkriteria
+            (id_kriteria, id_subkriteria1, id_subkriteria2, nilai_perbandingan)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE nilai_perbandingan = VALUES(nilai_perbandingan)""",
+            [(id_kriteria, id1, id2, nilai) for (id1, id2), nilai in comparison_data.items()]
+        )
+        conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
+        return True
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Gagal menyimpan perbandingan subkriteria: {str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def delete_perbandingan_subkriteria_batch(id_kriteria, comparisons):
+    """Menghapus beberapa perbandingan subkriteria sekaligus"""
+    if not comparisons:
+        return True
+    
+    conn = create_connection()
+    if conn is None:
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""DELETE FROM perbandingan_subkriteria
+            WHERE id_kriteria = %s
+            AND id_perbandingan IN ({", ".join(["%s"] * len(comparisons))})""",
+            [id_kriteria] + [comp["id_perbandingan"] for comp in comparisons]
+        )
+        conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
+        return True
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Gagal menghapus perbandingan subkriteria: {str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
 def reset_perbandingan_subkriteria(id_kriteria):
     """Mereset perbandingan subkriteria untuk kriteria tertentu"""
     conn = create_connection()
@@ -419,6 +718,8 @@ def reset_perbandingan_subkriteria(id_kriteria):
             (id_kriteria,)
         )
         conn.commit()
+        invalidate_weight_cache()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -428,6 +729,183 @@ def reset_perbandingan_subkriteria(id_kriteria):
         if conn:
             conn.close()
 
+# Fungsi Snapshot Perankingan
+# Umur cache sidik jari data (detik) dan jumlah snapshot yang disimpan per tahun ajaran
+DATA_VERSION_TTL = 10
+SNAPSHOT_RETENTION = int(os.environ.get("AHP_SNAPSHOT_RETENTION", 5))
+
+# Kolom yang memengaruhi hasil perankingan, dipakai untuk sidik jari input
+RANKING_INPUT_COLUMNS = {
+    "guru": ["id_guru", "id_tahun_ajaran", "nama_guru", "nip"],
+    "kriteria": ["id_kriteria"],
+    "subkriteria": ["id_subkriteria", "id_kriteria"],
+    "nilai_subkriteria": ["id_nilai", "id_guru", "id_subkriteria", "nilai", "tanggal_penilaian"],
+    "perbandingan_kriteria": ["id_kriteria1", "id_kriteria2", "nilai_perbandingan"],
+    "perbandingan_subkriteria": ["id_kriteria", "id_subkriteria1", "id_subkriteria2", "nilai_perbandingan"]
+}
+
+def get_data_version(table_columns, label="data"):
+    """
+    Menghitung sidik jari (hash) isi beberapa tabel, {nama_tabel: [kolom]}.
+    Checksum dihitung di server sehingga hanya satu baris yang dikirim, dan hasilnya
+    di-cache selama DATA_VERSION_TTL detik agar tidak memindai tabel di setiap rerun.
+    Returns:
+        str hash, None jika query gagal
+    """
+    return _query_data_version(label, tuple((table, tuple(cols)) for table, cols in table_columns.items()))
+
+@ttl_cache(DATA_VERSION_TTL)
+def _query_data_version(label, table_columns):
+    parts = [
+        f"""(SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS('|', {", ".join(cols)}))), 0))
+            FROM {table}) AS {table}"""
+        for table, cols in table_columns
+    ]
+    
+    rows = get_data(query="SELECT " + ", ".join(parts))
+    if not rows:
+        return None
+    return make_cache_key(label, sorted(rows[0].items()))
+
+def invalidate_data_version():
+    """Mengosongkan cache sidik jari data setelah data input perankingan berubah"""
+    _query_data_version.clear()
+
+def get_ranking_fingerprint():
+    """Menghitung sidik jari (hash) seluruh input perankingan"""
+    return get_data_version(RANKING_INPUT_COLUMNS, label="ranking")
+
+def save_ranking_snapshot(df_results, kriteria_weights, kriteria_cr, subkriteria_weights,
+                          subkriteria_cr, id_tahun_ajaran, input_hash):
+    """
+    Menyimpan hasil perankingan sebagai snapshot baru beserta bobot dan CR yang dipakai
+    Returns:
+        int: ID snapshot, None jika gagal
+    """
+    conn = create_connection()
+    if conn is None:
+        return None
+    
+    tanggal_hitung = datetime.now()
+    detail_cols = [col for col in df_results.columns if col.startswith('Kriteria')]
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO snapshot_ahp
+            (id_tahun_ajaran, input_hash, bobot_kriteria, bobot_subkriteria,
+             cr_kriteria, cr_subkriteria, tanggal_hitung)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (
+                id_tahun_ajaran,
+                input_hash,
+                json.dumps({str(k): float(w) for k, w in kriteria_weights.items()}),
+                json.dumps({
+                    str(k): {str(s): float(w) for s, w in v['weights'].items()}
+                    for k, v in subkriteria_weights.items()
+                }),
+                float(kriteria_cr),
+                json.dumps({str(k): float(cr) for k, cr in subkriteria_cr.items()}),
+                tanggal_hitung
+            )
+        )
+        id_snapshot = cursor.lastrowid
+        
+        cursor.executemany(
+            """INSERT INTO hasil_ahp
+            (id_snapshot, id_guru, total_nilai, detail_nilai, peringkat, tanggal_hitung)
+            VALUES (%s, %s, %s, %s, %s, %s)""",
+            [
+                (
+                    id_snapshot,
+                    int(row['id_guru']),
+                    float(row['total_score']),
+                    json.dumps({col: float(row[col]) for col in detail_cols}),
+                    int(row['Peringkat']),
+                    tanggal_hitung
+                )
+                for row in df_results.to_dict('records')
+            ]
+        )
+        conn.commit()
+        prune_ranking_snapshots(conn, id_tahun_ajaran)
+        return id_snapshot
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Gagal menyimpan hasil perankingan: {str(e)}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def prune_ranking_snapshots(conn, id_tahun_ajaran, keep=SNAPSHOT_RETENTION):
+    """
+    Menghapus snapshot lama (beserta baris hasil_ahp-nya) sehingga hanya `keep`
+    snapshot terbaru per tahun ajaran yang tersisa.
+    Kegagalan hanya dicatat karena snapshot baru sudah tersimpan.
+    """
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT id_snapshot FROM snapshot_ahp
+            WHERE id_tahun_ajaran <=> %s
+            ORDER BY id_snapshot DESC
+            LIMIT 1 OFFSET %s""",
+            (id_tahun_ajaran, max(int(keep), 1))
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        
+        cutoff = row[0]
+        cursor.execute(
+            """DELETE FROM hasil_ahp WHERE id_snapshot IN (
+                SELECT id_snapshot FROM snapshot_ahp
+                WHERE id_tahun_ajaran <=> %s AND id_snapshot <= %s)""",
+            (id_tahun_ajaran, cutoff)
+        )
+        cursor.execute(
+            "DELETE FROM snapshot_ahp WHERE id_tahun_ajaran <=> %s AND id_snapshot <= %s",
+            (id_tahun_ajaran, cutoff)
+        )
+        deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+    except Exception as e:
+        conn.rollback()
+        print(f"Gagal menghapus snapshot lama: {str(e)}")
+        return 0
+    finally:
+        if cursor:
+            cursor.close()
+
+def get_latest_ranking_snapshot(id_tahun_ajaran):
+    """
+    Mengambil snapshot perankingan terakhir untuk tahun ajaran tertentu
+    Returns:
+        dict snapshot dengan key 'hasil' (list baris hasil_ahp), None jika belum ada
+    """
+    rows = get_data(
+        "snapshot_ahp",
+        where="id_tahun_ajaran <=> %s",
+        params=(id_tahun_ajaran,),
+        order_by="id_snapshot DESC",
+        limit=1
+    )
+    if not rows:
+        return None
+    snapshot = rows[0]
+    
+    snapshot['hasil'] = get_data(
+        "hasil_ahp h JOIN guru g ON g.id_guru = h.id_guru",
+        columns=["h.id_guru", "g.nama_guru", "g.nip", "h.total_nilai", "h.detail_nilai", "h.peringkat"],
+        where="h.id_snapshot = %s",
+        params=(snapshot['id_snapshot'],),
+        order_by="h.id_hasil"
+    )
+    return snapshot
+
 def set_aktif_tahun_ajaran(tahun_ajaran_id):
     """Mengatur tahun ajaran yang aktif"""
     conn = create_connection()
@@ -445,6 +923,7 @@ def set_aktif_tahun_ajaran(tahun_ajaran_id):
             (tahun_ajaran_id,))
         
         conn.commit()
+        invalidate_data_version()
         return True
     except Exception as e:
         conn.rollback()
@@ -1,5 +1,11 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from openpyxl import load_workbook
+from database import bulk_insert
+
+# Jumlah baris Excel yang diproses dan disimpan per potongan
+IMPORT_CHUNK_SIZE = 5000
 
 def import_guru_data(uploaded_file):
     """Mengimpor data guru dari file Excel"""
@@ -28,37 +34,144 @@ def import_guru_data(uploaded_file):
     except Exception as e:
         raise Exception(f"Error import data: {str(e)}")
     
-def import_nilai_data(uploaded_file, guru_list, subkriteria_list):
-    """Mengimpor data nilai dari Excel"""
+def iter_excel_chunks(uploaded_file, sheet_name=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Membaca sheet Excel secara streaming (openpyxl read-only)
+    dan menghasilkan DataFrame per potongan baris
+    """
+    if hasattr(uploaded_file, 'seek'):
+        uploaded_file.seek(0)
+    
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(uploaded_file, engine='openpyxl')
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
         
-        # Validasi
-        if 'nip' not in df.columns:
-            raise ValueError("Kolom 'nip' tidak ditemukan")
-            
-        # Mapping data
-        subkriteria_map = {sub['nama_subkriteria']: sub['id_subkriteria'] for sub in subkriteria_list}
-        guru_map = {g['nip']: g['id_guru'] for g in guru_list}
-        
-        data_list = []
-        for _, row in df.iterrows():
-            nip = str(row['nip'])
-            if nip not in guru_map:
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+        n_cols = len(columns)
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
                 continue
-                
-            for col in df.columns:
-                if col in subkriteria_map:
-                    nilai = int(row[col])
-                    if 1 <= nilai <= 5:
-                        data_list.append({
-                            'id_guru': guru_map[nip],
-                            'id_subkriteria': subkriteria_map[col],
-                            'nilai': nilai,
-                            'tanggal_penilaian': pd.to_datetime(row['tanggal_penilaian']).date() if 'tanggal_penilaian' in df.columns else datetime.now().date()
-                        })
-        
+            buffer.append(tuple(row[:n_cols]) + (None,) * (n_cols - len(row)))
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        wb.close()
+
+def read_excel_preview(uploaded_file, sheet_name=None, n_rows=3):
+    """Membaca header dan beberapa baris pertama tanpa memuat seluruh file"""
+    chunks = iter_excel_chunks(uploaded_file, sheet_name=sheet_name, chunk_size=n_rows)
+    try:
+        return next(chunks, pd.DataFrame())
+    finally:
+        chunks.close()
+
+def transform_nilai_chunk(df, guru_map, subkriteria_map, nip_col='nip', date_col='tanggal_penilaian',
+                          rejected=None):
+    """
+    Mengubah potongan sheet format lebar (satu kolom per subkriteria)
+    menjadi baris nilai_subkriteria dengan operasi vektor pandas.
+    Baris dengan tanggal penilaian kosong/tidak valid tidak diimpor (tidak diganti
+    tanggal hari ini agar tidak menimpa penilaian hari ini); baris tersebut
+    ditambahkan ke list rejected jika diberikan, sebagai dict {nip, tanggal}.
+    """
+    if nip_col not in df.columns:
+        raise ValueError(f"Kolom '{nip_col}' tidak ditemukan")
+    
+    value_cols = [col for col in df.columns if col in subkriteria_map]
+    if df.empty or not value_cols:
+        return []
+    
+    # Hash join NIP -> id_guru (NIP numerik dari Excel dinormalisasi ke teks)
+    nip = df[nip_col].astype(str).str.replace(r"\.0$", "", regex=True)
+    id_guru = nip.map(guru_map)
+    
+    if date_col in df.columns:
+        tanggal = pd.to_datetime(df[date_col], errors='coerce')
+        invalid = tanggal.isna() & id_guru.notna()
+        if rejected is not None and invalid.any():
+            rejected.extend(
+                {'nip': n, 'tanggal': t}
+                for n, t in zip(nip[invalid], df.loc[invalid, date_col])
+            )
+    else:
+        # Tanpa kolom tanggal sama sekali, seluruh nilai dicatat sebagai penilaian hari ini
+        tanggal = pd.Series(pd.Timestamp(datetime.now().date()), index=df.index)
+    
+    wide = df[value_cols].copy()
+    wide['id_guru'] = id_guru
+    wide['tanggal_penilaian'] = tanggal.dt.date
+    wide = wide[wide['id_guru'].notna() & tanggal.notna()]
+    
+    long_df = wide.melt(
+        id_vars=['id_guru', 'tanggal_penilaian'],
+        value_vars=value_cols,
+        var_name='nama_subkriteria',
+        value_name='nilai'
+    )
+    # Nilai pecahan dibulatkan ke bawah (seperti int()) sebelum dicek rentang 1-5
+    nilai = np.trunc(pd.to_numeric(long_df['nilai'], errors='coerce'))
+    long_df = long_df[nilai.between(1, 5)]
+    
+    return pd.DataFrame({
+        'id_guru': long_df['id_guru'].astype(int),
+        'id_subkriteria': long_df['nama_subkriteria'].map(subkriteria_map).astype(int),
+        'nilai': nilai[long_df.index].astype(int),
+        'tanggal_penilaian': long_df['tanggal_penilaian']
+    }).to_dict('records')
+
+def iter_nilai_chunks(uploaded_file, guru_list, subkriteria_list, sheet_name=None,
+                      nip_col='nip', date_col='tanggal_penilaian', chunk_size=IMPORT_CHUNK_SIZE,
+                      rejected=None):
+    """Menghasilkan data nilai siap simpan per potongan baris Excel"""
+    subkriteria_map = {sub['nama_subkriteria']: sub['id_subkriteria'] for sub in subkriteria_list}
+    guru_map = {str(g['nip']): g['id_guru'] for g in guru_list}
+    
+    for df in iter_excel_chunks(uploaded_file, sheet_name=sheet_name, chunk_size=chunk_size):
+        yield transform_nilai_chunk(df, guru_map, subkriteria_map, nip_col=nip_col, date_col=date_col,
+                                    rejected=rejected)
+
+def import_nilai_data(uploaded_file, guru_list, subkriteria_list, rejected=None):
+    """Mengimpor data nilai dari Excel (baris bertanggal tidak valid masuk ke rejected)"""
+    try:
+        data_list = []
+        for chunk in iter_nilai_chunks(uploaded_file, guru_list, subkriteria_list, rejected=rejected):
+            data_list.extend(chunk)
         return data_list
         
     except Exception as e:
-        raise Exception(f"Error import nilai: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error import nilai: {str(e)}")
+
+def import_nilai_file(uploaded_file, guru_list, subkriteria_list, sheet_name=None,
+                      nip_col='nip', date_col='tanggal_penilaian', chunk_size=IMPORT_CHUNK_SIZE,
+                      on_conflict="update", rejected=None):
+    """
+    Mengimpor nilai dari Excel langsung ke database per potongan baris,
+    sehingga memori yang dipakai tetap walaupun file sangat besar.
+    Nilai dengan guru, subkriteria, dan tanggal yang sama di-upsert
+    (on_conflict="update") atau dilewati (on_conflict="ignore").
+    Baris dengan tanggal penilaian tidak valid dilewati dan ditambahkan ke rejected.
+    Returns:
+        int: jumlah data nilai yang disimpan
+    """
+    try:
+        total = 0
+        for chunk in iter_nilai_chunks(uploaded_file, guru_list, subkriteria_list, sheet_name=sheet_name,
+                                       nip_col=nip_col, date_col=date_col, chunk_size=chunk_size,
+                                       rejected=rejected):
+            if not chunk:
+                continue
+            if not bulk_insert("nilai_subkriteria", chunk, on_conflict=on_conflict, update_columns=['nilai']):
+                raise Exception(f"Gagal menyimpan ke database setelah {total} data")
+            total += len(chunk)
+        return total
+        
+    except Exception as e:
+        raise Exception(f"Error import nilai: {str(e)}")
@@ -0,0 +1,151 @@
+# utils/profiling.py
+"""
+Profiling per halaman untuk rerun Streamlit.
+
+profile_page menjalankan fungsi halaman di bawah cProfile, menyimpan file .prof
+dan catatan waktu wall/CPU per rerun ke PROFILE_DIR, lalu mengembalikan laporan
+hotspot (top-N fungsi dan pembagian waktu per kategori: SQL, pandas styling,
+eig/numpy, chart). Laporan dapat dibandingkan dengan baseline yang disimpan.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import shutil
+import time
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get(
+    "AHP_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profiles")
+)
+RUNS_FILE = "runs.jsonl"
+TOP_N = 15
+
+# Kategori waktu berdasarkan lokasi file fungsi (urutan menentukan prioritas)
+CATEGORIES = [
+    ("SQL", ("mysql/connector", "mysql\\connector", "sqlite3")),
+    ("Pandas styling", ("pandas/io/formats", "pandas\\io\\formats")),
+    ("Pandas", ("pandas",)),
+    ("Eig/NumPy", ("numpy", "scipy")),
+    ("Chart", ("plotly", "matplotlib", "seaborn", "altair")),
+    ("Streamlit", ("streamlit",)),
+]
+
+def _slug(page):
+    return re.sub(r"[^a-z0-9]+", "_", page.lower()).strip("_")
+
+def _function_label(key):
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+def _categorize(filename, name):
+    # Fungsi built-in (C) tidak punya file, kategorinya dikenali dari nama modulnya
+    location = name if filename == "~" else filename
+    for category, patterns in CATEGORIES:
+        if any(p in location for p in patterns):
+            return category
+    return "Lainnya"
+
+def top_functions(stats, n=TOP_N, sort="cumulative"):
+    """Top-N fungsi dari pstats.Stats, diurutkan berdasarkan cumtime atau tottime"""
+    rows = [
+        {
+            "fungsi": _function_label(key),
+            "ncalls": nc,
+            "tottime": tt,
+            "cumtime": ct
+        }
+        for key, (cc, nc, tt, ct, callers) in stats.stats.items()
+    ]
+    field = "cumtime" if sort == "cumulative" else "tottime"
+    return sorted(rows, key=lambda r: r[field], reverse=True)[:n]
+
+def category_breakdown(stats):
+    """Total waktu sendiri (tottime) per kategori, untuk melihat ke mana waktu rerun habis"""
+    totals = {}
+    for (filename, line, name), (cc, nc, tt, ct, callers) in stats.stats.items():
+        category = _categorize(filename, name)
+        totals[category] = totals.get(category, 0.0) + tt
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+def profile_page(page, func, *args, **kwargs):
+    """
+    Menjalankan func di bawah profiler dan menyimpan hasilnya.
+    Returns:
+        tuple: (hasil func, laporan dict) - laporan None jika profiler tidak dapat dipakai
+    """
+    profiler = cProfile.Profile()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Profiler lain sedang aktif (mis. sesi lain), jalankan tanpa profiling
+        return func(*args, **kwargs), None
+
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        wall_s = time.perf_counter() - wall_start
+        cpu_s = time.thread_time() - cpu_start
+
+    report = save_profile(page, profiler, wall_s, cpu_s)
+    return result, report
+
+def save_profile(page, profiler, wall_s, cpu_s):
+    """Menyimpan file .prof dan catatan waktu, lalu menyusun laporan hotspot"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    prof_path = os.path.join(PROFILE_DIR, f"{timestamp}_{_slug(page)}.prof")
+    profiler.dump_stats(prof_path)
+
+    stats = pstats.Stats(profiler)
+    report = {
+        "halaman": page,
+        "waktu": datetime.now().isoformat(timespec="seconds"),
+        "wall_s": wall_s,
+        "cpu_s": cpu_s,
+        "file": prof_path,
+        "kategori": category_breakdown(stats),
+        "top": top_functions(stats)
+    }
+    with open(os.path.join(PROFILE_DIR, RUNS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps({k: v for k, v in report.items() if k != "top"}) + "\n")
+    return report
+
+def baseline_path(page):
+    return os.path.join(PROFILE_DIR, f"baseline_{_slug(page)}.prof")
+
+def save_baseline(page, prof_path):
+    """Menjadikan file .prof sebuah rerun sebagai baseline halaman tersebut"""
+    shutil.copyfile(prof_path, baseline_path(page))
+
+def diff_against_baseline(page, prof_path, n=TOP_N):
+    """
+    Membandingkan cumtime per fungsi terhadap baseline halaman.
+    Returns:
+        list dict (fungsi, baseline, sekarang, selisih) diurutkan berdasarkan selisih
+        terbesar, atau None jika baseline belum ada
+    """
+    path = baseline_path(page)
+    if not os.path.exists(path):
+        return None
+
+    base = pstats.Stats(path).stats
+    current = pstats.Stats(prof_path).stats
+    rows = []
+    for key in set(base) | set(current):
+        before = base[key][3] if key in base else 0.0
+        after = current[key][3] if key in current else 0.0
+        rows.append({
+            "fungsi": _function_label(key),
+            "baseline": before,
+            "sekarang": after,
+            "selisih": after - before
+        })
+    return sorted(rows, key=lambda r: abs(r["selisih"]), reverse=True)[:n]
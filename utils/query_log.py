@@ -0,0 +1,228 @@
+# utils/query_log.py
+"""
+Instrumentasi query database: bentuk SQL, jumlah baris, waktu, dan halaman pemanggil.
+
+Setiap koneksi dari create_connection dibungkus sehingga seluruh query
+(get_data, save_data, bulk_insert, maupun cursor langsung) tercatat.
+Query yang lebih lambat dari AHP_SLOW_QUERY_MS ditulis ke file slow-query log.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+# Ambang slow query (milidetik) dan lokasi file log, dapat diatur lewat environment
+SLOW_QUERY_MS = float(os.environ.get("AHP_SLOW_QUERY_MS", 200))
+SLOW_QUERY_LOG = os.environ.get(
+    "AHP_SLOW_QUERY_LOG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "slow_query.log")
+)
+ENABLED = os.environ.get("AHP_QUERY_LOG", "1") != "0"
+
+# Modul yang dilewati saat mencari fungsi pemanggil
+_INTERNAL_MODULES = {__name__, "database"}
+
+_local = threading.local()
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+
+def normalize_sql(sql):
+    """
+    Bentuk SQL tanpa nilai: literal dan placeholder menjadi ?, daftar IN/VALUES
+    diringkas, sehingga query yang sama dengan nilai berbeda dikelompokkan bersama
+    """
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode("utf-8", "replace")
+    shape = " ".join(str(sql).split())
+    shape = shape.replace("%s", "?")
+    shape = _STRING_LITERAL.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(...)", shape)
+    shape = _VALUES_LIST.sub(r"\1", shape)
+    return shape
+
+def start_rerun(page=None):
+    """Memulai pencatatan untuk satu rerun skrip (per thread sesi Streamlit)"""
+    _local.page = page
+    _local.queries = []
+
+def set_page(page):
+    """Mengatur nama halaman yang sedang dirender"""
+    _local.page = page
+
+def get_rerun_queries():
+    """Daftar query yang tercatat sejak start_rerun terakhir"""
+    return list(getattr(_local, "queries", []))
+
+def summarize(queries):
+    """
+    Ringkasan per (halaman, pemanggil, bentuk SQL): jumlah eksekusi, total baris, dan waktu.
+    Bentuk yang dieksekusi berkali-kali dalam satu rerun adalah kandidat N+1.
+    """
+    summary = {}
+    for q in queries:
+        key = (q["page"], q["caller"], q["shape"])
+        entry = summary.setdefault(key, {
+            "page": q["page"],
+            "shape": q["shape"],
+            "caller": q["caller"],
+            "count": 0,
+            "rows": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0
+        })
+        entry["count"] += 1
+        entry["rows"] += max(q["rows"], 0)
+        entry["total_ms"] += q["ms"]
+        entry["max_ms"] = max(entry["max_ms"], q["ms"])
+    return sorted(summary.values(), key=lambda e: e["total_ms"], reverse=True)
+
+def _find_caller():
+    """Nama fungsi pemanggil pertama di luar lapisan database"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _INTERNAL_MODULES:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        with _slow_logger_lock:
+            if _slow_logger is None:
+                logger = logging.getLogger("ahp.slow_query")
+                logger.propagate = False
+                try:
+                    os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+                    handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+                    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                    logger.addHandler(handler)
+                except OSError as e:
+                    print(f"Slow query log tidak dapat dibuka: {e}")
+                    logger.addHandler(logging.NullHandler())
+                _slow_logger = logger
+    return _slow_logger
+
+def _finish(entry):
+    """Dipanggil setelah hasil query selesai dibaca (atau query berikutnya dimulai)"""
+    if entry.get("done"):
+        return
+    entry["done"] = True
+    if entry["ms"] >= SLOW_QUERY_MS:
+        _get_slow_logger().warning(
+            "%.1f ms rows=%d page=%s caller=%s sql=%s",
+            entry["ms"], entry["rows"], entry["page"], entry["caller"], entry["shape"]
+        )
+
+def record(sql, elapsed_s, rows=-1):
+    """Mencatat satu query; mengembalikan entri agar waktu fetch dapat ditambahkan"""
+    entry = {
+        "page": getattr(_local, "page", None),
+        "caller": _find_caller(),
+        "shape": normalize_sql(sql),
+        "rows": rows,
+        "ms": elapsed_s * 1000
+    }
+    queries = getattr(_local, "queries", None)
+    if queries is not None:
+        queries.append(entry)
+    return entry
+
+
+class InstrumentedCursor:
+    """Cursor pembungkus yang mencatat waktu execute + fetch dan jumlah baris"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._entry = None
+
+    def _close_entry(self):
+        if self._entry is not None:
+            if self._entry["rows"] < 0:
+                self._entry["rows"] = max(getattr(self._cursor, "rowcount", -1) or 0, 0)
+            _finish(self._entry)
+            self._entry = None
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._close_entry()
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._entry = record(operation, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._close_entry()
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._entry = record(operation, time.perf_counter() - start)
+
+    def _timed_fetch(self, method, *args):
+        start = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        if self._entry is not None:
+            self._entry["ms"] += (time.perf_counter() - start) * 1000
+            if method == "fetchone":
+                self._entry["rows"] = max(self._entry["rows"], 0) + (result is not None)
+            else:
+                self._entry["rows"] = max(self._entry["rows"], 0) + len(result)
+        return result
+
+    def fetchall(self):
+        return self._timed_fetch("fetchall")
+
+    def fetchmany(self, size=1):
+        return self._timed_fetch("fetchmany", size)
+
+    def fetchone(self):
+        return self._timed_fetch("fetchone")
+
+    def close(self):
+        self._close_entry()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Koneksi pembungkus; seluruh cursor yang dibuat ikut diinstrumentasi"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursors = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+        self._cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        # Sebagian pemanggil hanya menutup koneksi, tutup juga catatan query cursor-nya
+        for cursor in self._cursors:
+            cursor._close_entry()
+        self._cursors = []
+        return self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def instrument_connection(conn):
+    """Membungkus koneksi agar query-nya tercatat (tanpa perubahan jika dimatikan)"""
+    if conn is None or not ENABLED:
+        return conn
+    return InstrumentedConnection(conn)
@@ -1,100 +1,321 @@
 # utils/stats_utils.py
-import pandas as pd
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from scipy import stats
-import matplotlib.pyplot as plt
-import seaborn as sns  # Import library seaborn
-import tempfile
-from database import create_connection
+import pandas as pd
+from database import get_data
+from utils.cache_utils import make_cache_key
+from utils.db_functions import get_data_version
+
+# Resolusi plot untuk ditampilkan di layar (bukan cetak)
+PLOT_DPI = 100
+
+# Tabel yang memengaruhi hasil korelasi, dipakai sebagai versi data cache
+SPEARMAN_INPUT_COLUMNS = {
+    "nilai_subkriteria": ["id_nilai", "id_guru", "id_subkriteria", "nilai", "tanggal_penilaian"],
+    "subkriteria": ["id_subkriteria", "nama_subkriteria"]
+}
+
+# Cache hasil korelasi per (filter, versi data), dipakai bersama seluruh sesi
+MAX_SPEARMAN_CACHE_SIZE = 32
+
+# Bootstrap: jumlah elemen sampel (resample x baris x subkriteria) per batch,
+# dan jumlah resample minimum sebelum pekerjaan dibagi ke process pool
+BOOTSTRAP_BATCH_ELEMENTS = 4_000_000
+BOOTSTRAP_PARALLEL_MIN = 500
+
+_spearman_cache = {}
+_spearman_cache_lock = threading.Lock()
+
+def clear_spearman_cache():
+    """Mengosongkan cache hasil korelasi Spearman"""
+    with _spearman_cache_lock:
+        _spearman_cache.clear()
+
+def load_spearman_data(guru_id=None, start_date=None, end_date=None):
+    """
+    Mengambil nilai subkriteria dan menyusunnya menjadi tabel lebar:
+    satu baris per (guru, tanggal_penilaian), satu kolom per subkriteria
+    """
+    conditions = []
+    params = []
+    if guru_id:
+        conditions.append("n.id_guru = %s")
+        params.append(guru_id)
+    if start_date:
+        conditions.append("n.tanggal_penilaian >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append("n.tanggal_penilaian <= %s")
+        params.append(end_date)
+
+    rows = get_data(
+        "nilai_subkriteria n",
+        columns=["n.id_guru", "n.tanggal_penilaian", "n.id_subkriteria", "n.nilai"],
+        where=" AND ".join(conditions),
+        params=params
+    )
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows)
+    df['nilai'] = df['nilai'].astype(float)
+    wide = df.groupby(['id_guru', 'tanggal_penilaian', 'id_subkriteria'])['nilai'].mean().unstack()
+
+    # Kolom diberi nama subkriteria (urut id_subkriteria)
+    names = {
+        s['id_subkriteria']: s['nama_subkriteria']
+        for s in get_data("subkriteria", columns=["id_subkriteria", "nama_subkriteria"])
+    }
+    wide = wide.sort_index(axis=1)
+    wide.columns = [names.get(i, f"Subkriteria {i}") for i in wide.columns]
+    return wide
+
+def rank_columns(values):
+    """Rank (rata-rata untuk nilai sama) per kolom, NaN tetap NaN"""
+    return pd.DataFrame(values).rank(method='average').to_numpy()
+
+def spearman_matrix(values):
+    """
+    Korelasi Spearman seluruh pasangan kolom sekaligus beserta p-value (uji t, dua sisi).
+    Data lengkap dihitung dengan satu np.corrcoef atas rank; jika ada nilai kosong,
+    korelasi tiap pasangan memakai baris yang lengkap untuk pasangan tersebut.
+    Returns:
+        tuple: (matriks korelasi, matriks p-value, matriks jumlah observasi)
+    """
+    from scipy import stats
+
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    n_obs = present.T.astype(int) @ present.astype(int)
+
+    if present.all():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.corrcoef(rank_columns(values), rowvar=False)
+    else:
+        corr = pd.DataFrame(values).corr(method='spearman').to_numpy()
+    corr = np.atleast_2d(corr)
+
+    df = n_obs - 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = corr * np.sqrt(df / np.clip(1 - corr ** 2, 1e-300, None))
+        p_values = 2 * stats.t.sf(np.abs(t), np.maximum(df, 1))
+    p_values[df < 1] = np.nan
+    np.fill_diagonal(p_values, 0.0)
+    return corr, p_values, n_obs
+
+def render_spearman_heatmap(corr_df, dpi=PLOT_DPI):
+    """Heatmap segitiga bawah korelasi sebagai bytes PNG (tanpa file sementara)"""
+    from matplotlib.figure import Figure
+    import seaborn as sns
+
+    n = len(corr_df)
+    fig = Figure(figsize=(max(6, 0.6 * n + 2), max(4, 0.5 * n + 1.5)))
+    ax = fig.subplots()
+
+    # Buat mask untuk segitiga atas
+    mask = np.triu(np.ones_like(corr_df.to_numpy(), dtype=bool))
+    sns.heatmap(
+        corr_df,
+        mask=mask,
+        annot=n <= 20,
+        fmt=".2f",
+        cmap="coolwarm",
+        center=0,
+        vmin=-1,
+        vmax=1,
+        ax=ax
+    )
+    ax.set_title("Korelasi Rank Spearman Antar Subkriteria", pad=20)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.tick_params(axis='y', labelrotation=0)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+def _get_spearman_entry(guru_id=None, start_date=None, end_date=None):
+    """
+    Mengambil (atau menghitung dan meng-cache) tabel lebar beserta matriks korelasinya.
+    Returns:
+        dict entri cache, None jika data kurang dari 2 baris/subkriteria
+    """
+    version = get_data_version(SPEARMAN_INPUT_COLUMNS, label="spearman")
+    cache_key = make_cache_key(guru_id, str(start_date), str(end_date), version)
+
+    with _spearman_cache_lock:
+        entry = _spearman_cache.get(cache_key) if version else None
+    if entry is not None:
+        return entry
+
+    wide = load_spearman_data(guru_id, start_date, end_date)
+    if wide.shape[0] < 2 or wide.shape[1] < 2:
+        return None
 
-def calculate_spearman_rank(guru_id=None, start_date=None, end_date=None):
+    corr, p_values, _ = spearman_matrix(wide.to_numpy())
+    names = list(wide.columns)
+    entry = {
+        'wide': wide,
+        'corr': pd.DataFrame(corr, index=names, columns=names),
+        'p': pd.DataFrame(p_values, index=names, columns=names),
+        'plots': {},
+        'ci': {}
+    }
+    if version:
+        with _spearman_cache_lock:
+            if len(_spearman_cache) >= MAX_SPEARMAN_CACHE_SIZE:
+                _spearman_cache.clear()
+            _spearman_cache[cache_key] = entry
+    return entry
+
+def calculate_spearman_rank(guru_id=None, start_date=None, end_date=None, with_plot=True, dpi=PLOT_DPI):
     """
     Menghitung korelasi rank Spearman antar subkriteria
-    
+
     Parameters:
         guru_id: ID guru tertentu (None untuk semua guru)
         start_date: Tanggal awal (None untuk tidak dibatasi)
         end_date: Tanggal akhir (None untuk tidak dibatasi)
-    
+        with_plot: False untuk hanya mengembalikan matriks (tanpa render plot)
+        dpi: resolusi plot PNG
+
     Returns:
-        Tuple: (correlation_matrix, p_value_matrix, plot_path)
+        Tuple: (correlation DataFrame, p-value DataFrame, bytes PNG atau None)
+        Hasil di-cache per filter dan versi data nilai_subkriteria.
     """
-    conn = None
     try:
-        # Dapatkan data dari database
-        conn = create_connection()
-        query = """
-        SELECT n.id_guru, n.id_subkriteria, s.nama_subkriteria, n.nilai, n.tanggal_penilaian
-        FROM nilai_subkriteria n
-        JOIN subkriteria s ON n.id_subkriteria = s.id_subkriteria
-        """
-        
-        conditions = []
-        if guru_id:
-            conditions.append(f"n.id_guru = {guru_id}")
-        if start_date:
-            conditions.append(f"n.tanggal_penilaian >= '{start_date}'")
-        if end_date:
-            conditions.append(f"n.tanggal_penilaian <= '{end_date}'")
-        
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY n.id_guru, n.tanggal_penilaian"
-        
-        df = pd.read_sql(query, conn)
-        
-        if df.empty:
+        entry = _get_spearman_entry(guru_id, start_date, end_date)
+        if entry is None:
             return None, None, None
-        
-        # Pivot data untuk korelasi
-        pivot_df = df.pivot_table(
-            index=['id_guru', 'tanggal_penilaian'],
-            columns='nama_subkriteria',
-            values='nilai',
-            aggfunc='mean'
-        ).reset_index()
-        
-        # Hitung korelasi Spearman
-        corr_matrix, p_matrix = stats.spearmanr(
-            pivot_df.select_dtypes(include=[np.number]), 
-            nan_policy='omit'
-        )
-        
-        # Buat visualisasi
-        plt.figure(figsize=(12, 8))
-        subkriteria_names = pivot_df.select_dtypes(include=[np.number]).columns.tolist()
-        
-        # Buat mask untuk segitiga atas
-        mask = np.triu(np.ones_like(corr_matrix, dtype=bool))
-        
-        sns.heatmap(
-            corr_matrix,
-            mask=mask,
-            annot=True,
-            fmt=".2f",
-            cmap="coolwarm",
-            center=0,
-            xticklabels=subkriteria_names,
-            yticklabels=subkriteria_names,
-            vmin=-1,
-            vmax=1
-        )
-        plt.title("Korelasi Rank Spearman Antar Subkriteria", pad=20)
-        plt.xticks(rotation=45, ha='right')
-        plt.yticks(rotation=0)
-        
-        # Simpan plot ke file temporer
-        plot_path = tempfile.mktemp(suffix='.png')
-        plt.savefig(plot_path, bbox_inches='tight', dpi=300)
-        plt.close()
-        
-        return corr_matrix, p_matrix, plot_path
-        
+
+        plot = None
+        if with_plot:
+            plot = entry['plots'].get(dpi)
+            if plot is None:
+                plot = render_spearman_heatmap(entry['corr'], dpi=dpi)
+                entry['plots'][dpi] = plot
+
+        return entry['corr'].copy(), entry['p'].copy(), plot
+
     except Exception as e:
         print(f"Error in spearman calculation: {str(e)}")
         return None, None, None
-    finally:
-        if conn:
-            conn.close()
-        plt.close('all')
\ No newline at end of file
+
+def _resample_spearman(codes, n_levels, idx):
+    """
+    Korelasi Spearman untuk sekumpulan resample sekaligus.
+    codes: kode rank padat per kolom (n, p), idx: indeks baris resample (b, n).
+    Rank setiap resample diturunkan dari jumlah kemunculan tiap kode (bincount),
+    sehingga data tidak perlu diurutkan ulang per resample.
+    """
+    b, n = idx.shape
+    p = codes.shape[1]
+    sample = codes[idx].transpose(0, 2, 1)  # (b, p, n)
+
+    offsets = (np.arange(b)[:, None, None] * p + np.arange(p)[None, :, None]) * n_levels
+    counts = np.bincount((sample + offsets).ravel(), minlength=b * p * n_levels)
+    counts = counts.reshape(b, p, n_levels)
+
+    # Rank rata-rata tiap kode = jumlah nilai lebih kecil + (jumlah nilai sama + 1) / 2
+    avg_rank = np.cumsum(counts, axis=2) - counts + (counts + 1) / 2
+    ranks = np.take_along_axis(avg_rank, sample, axis=2)
+
+    ranks -= ranks.mean(axis=2, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ranks /= np.sqrt((ranks ** 2).sum(axis=2, keepdims=True))
+    return ranks @ ranks.transpose(0, 2, 1)
+
+def _bootstrap_worker(codes, n_levels, n_resamples, batch_size, seed):
+    """Menjalankan n_resamples resample dalam batch (dipanggil di process pool)"""
+    rng = np.random.default_rng(seed)
+    n, p = codes.shape
+    result = np.empty((n_resamples, p, p))
+    for start in range(0, n_resamples, batch_size):
+        b = min(batch_size, n_resamples - start)
+        idx = rng.integers(0, n, size=(b, n))
+        result[start:start + b] = _resample_spearman(codes, n_levels, idx)
+    return result
+
+def bootstrap_spearman_ci(wide, n_resamples=2000, confidence=0.95, n_jobs=None, seed=0):
+    """
+    Interval kepercayaan bootstrap (persentil) korelasi Spearman tiap pasangan kolom.
+    Hanya baris yang lengkap untuk seluruh kolom yang di-resample.
+
+    Parameters:
+        wide: tabel lebar dari load_spearman_data
+        n_resamples: jumlah resample bootstrap
+        confidence: tingkat kepercayaan (mis. 0.95)
+        n_jobs: jumlah proses (None = jumlah CPU, 1 = tanpa process pool)
+        seed: seed acak agar hasil dapat diulang
+
+    Returns:
+        Tuple: (batas bawah DataFrame, batas atas DataFrame), (None, None) jika data kurang
+    """
+    complete = wide.dropna()
+    if len(complete) < 3:
+        return None, None
+
+    # Rank sekali: ubah setiap kolom menjadi kode urutan nilai unik
+    values = complete.to_numpy(dtype=float)
+    codes = np.empty(values.shape, dtype=np.int64)
+    for j in range(values.shape[1]):
+        codes[:, j] = np.unique(values[:, j], return_inverse=True)[1]
+    n_levels = int(codes.max()) + 1
+
+    n, p = codes.shape
+    batch_size = max(1, BOOTSTRAP_BATCH_ELEMENTS // (n * p))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_resamples < BOOTSTRAP_PARALLEL_MIN:
+        n_jobs = 1
+    chunks = [len(c) for c in np.array_split(np.arange(n_resamples), n_jobs) if len(c)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if len(chunks) == 1:
+        samples = _bootstrap_worker(codes, n_levels, chunks[0], batch_size, seeds[0])
+    else:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [
+                executor.submit(_bootstrap_worker, codes, n_levels, size, batch_size, child)
+                for size, child in zip(chunks, seeds)
+            ]
+            samples = np.concatenate([f.result() for f in futures])
+
+    alpha = (1 - confidence) / 2
+    lower, upper = np.nanpercentile(samples, [100 * alpha, 100 * (1 - alpha)], axis=0)
+    names = list(wide.columns)
+    return (
+        pd.DataFrame(lower, index=names, columns=names),
+        pd.DataFrame(upper, index=names, columns=names)
+    )
+
+def calculate_spearman_ci(guru_id=None, start_date=None, end_date=None,
+                          n_resamples=2000, confidence=0.95, n_jobs=None, seed=0):
+    """
+    Interval kepercayaan bootstrap untuk hasil calculate_spearman_rank dengan filter yang sama.
+    Memakai tabel lebar yang sudah di-cache; hasil interval juga di-cache.
+    Returns:
+        Tuple: (batas bawah DataFrame, batas atas DataFrame)
+    """
+    try:
+        entry = _get_spearman_entry(guru_id, start_date, end_date)
+        if entry is None:
+            return None, None
+
+        key = (n_resamples, confidence, seed)
+        if key not in entry['ci']:
+            entry['ci'][key] = bootstrap_spearman_ci(
+                entry['wide'], n_resamples=n_resamples, confidence=confidence,
+                n_jobs=n_jobs, seed=seed
+            )
+        lower, upper = entry['ci'][key]
+        if lower is None:
+            return None, None
+        return lower.copy(), upper.copy()
+
+    except Exception as e:
+        print(f"Error in spearman bootstrap: {str(e)}")
+        return None, None